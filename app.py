@@ -2,44 +2,331 @@
 # -------------------------------------------- Import Packages ------------------------------------------------------#
 # -------------------------------------------------------------------------------------------------------------------#
 
+import collections
+import logging
+import os
+import threading
+import time
+
 import dash
 import dash_core_components as dcc
 import dash_html_components as html
-from dash.dependencies import Input, Output, State
-import numpy as np
-import pandas as pd
-import plotly.graph_objs as go
+from dash.dependencies import ClientsideFunction, Input, Output, State
+from flask import has_request_context
+
+from bundles import Bundles
+from cache import ResultCache
+from compression import Compression
+from dataservice import DataServiceClient, DataServiceError
+from metrics import Metrics
+from pool import ComputePool, PoolBusy, PoolCancelled, PoolTimeout
+from sessions import Sessions
+from startup import LAZY, HealthCheck, lazy_import
+
+log = logging.getLogger(__name__)
+
+# pandas and everything built on it, deferred to warm_up() with OLYMPICS_LAZY=1 (see startup.py)
+aggregate = lazy_import('cube')
+bitmaps = lazy_import('bitmaps')
+dataset = lazy_import('dataset')
+drilldown = lazy_import('drilldown')
+figures = lazy_import('figures')
+trends = lazy_import('trends')
 
 # -------------------------------------------------------------------------------------------------------------------#
 # -------------------------------------------- Dataset Loading ------------------------------------------------------#
 # -------------------------------------------------------------------------------------------------------------------#
 
-# Load the Olympics Games DataFrame into pandas
+# Everything the callbacks read, built from the data once it is loaded:
+# - df: the Olympics Games DataFrame
+# - cube: the medal counts per Year x Country x Gender x Sport, every filter of the app is answered from it
+# - static_figures: the Sports played per Gender heatmap and the Gender Swap bars, they cover every Games whatever
+#   the filters so they are built and serialized once
+# - drill_index: posting lists of the rows of every Sport, Discipline, Event, Athlete and country, for the
+#   drill-down panel
+# - bitmap_index: bitmaps of the rows of every Year, Country, Gender, Season, Sport, Discipline and Medal, for the
+#   filters the cube doesn't cover
+# - gender_gap: prefix sums of the medals over the Games per country, gender and sport, for the gender gap trend
+# - values: the sorted values of the year slider and of the dropdowns, for the page and the filter keys
+# - compact_counts: the compact_counts store of the page in the clientside mode (see compact_payload), else None
+# With a data service, the service has the cube and the indexes: this worker only keeps df, the values, the
+# figures fetched from the service and the compact counts that come with them, the others are None.
+# Never modified: a new edition builds a new Snapshot that replaces the current one in a single assignment, and
+# every callback reads `snapshot` once when it starts, so it never mixes the data of two editions.
+Snapshot = collections.namedtuple('Snapshot',
+                                  'df cube static_figures drill_index bitmap_index gender_gap values compact_counts')
+
+# Filters besides the years and the countries, answered through the bitmap index
+EXTRA_FILTERS = ['Season', 'Sport', 'Discipline', 'Medal']
+
+# Opt-in: the country and sports cards and the donut are computed in the browser from a compact table of the
+# cube sent with the page, without a request per filter change. The athletes card and the bar chart, which
+# need the server side data, stay server callbacks.
+CLIENTSIDE = os.environ.get('OLYMPICS_CLIENTSIDE') == '1'
+
+# Loaded by warm_up(), at import or, with OLYMPICS_LAZY=1, on the first request (or from the gunicorn hooks)
+snapshot = None
+
+# Results of update_graphs, the slider only has 33 marks so the same filters come back all the time
+# (the namespace is the fingerprint of the data, set once it is loaded)
+result_cache = ResultCache(max_entries=int(os.environ.get('OLYMPICS_CACHE_ENTRIES', 256)),
+                           max_bytes=int(os.environ.get('OLYMPICS_CACHE_BYTES', 64 * 1024 * 1024)),
+                           cache_dir=os.environ.get('OLYMPICS_CACHE_DIR'),
+                           max_disk_bytes=int(os.environ.get('OLYMPICS_CACHE_DISK_BYTES', 256 * 1024 * 1024)))
+
+# Answers exported ahead of time by export.py, served when OLYMPICS_BUNDLES_DIR points to bundles of this data;
+# the filters that were not exported are computed live
+bundles = Bundles(os.environ.get('OLYMPICS_BUNDLES_DIR'))
+
+# Opt-in: the filter callbacks and the heatmap are computed by data service processes (python dataservice.py)
+# instead of this worker, which keeps the data for the page and the drill-down only
+data_service = DataServiceClient(os.environ.get('OLYMPICS_DATA_SERVICE'),
+                                 size=int(os.environ.get('OLYMPICS_DATA_SERVICE_CONNECTIONS', 4)),
+                                 timeout=float(os.environ.get('OLYMPICS_DATA_SERVICE_TIMEOUT', 10)))
+
+# Time of each step of warm_up(), in seconds
+startup_seconds = {}
+loaded = threading.Event()
+warm_up_lock = threading.Lock()
+
+
+def filter_values(df):
+    # Sorted values of the year slider (ints), the country dropdown and the other filters
+    values = {column: aggregate.codes_of(df[column])[1] for column in ['Year', 'Country_Name'] + EXTRA_FILTERS}
+    values['Year'] = [int(year) for year in values['Year']]
+    return values
+
+
+def compact_payload(counts):
+    # compact_counts store of the clientside mode: AggregateCube.compact_counts + the layout of the donut. For the
+    # bundled CSV, about 42 KB of JSON for the counts and 13 KB for the donut (12 KB gzipped in all). Built once
+    # per snapshot, every page load sends the same one.
+    if not CLIENTSIDE or counts is None:
+        return None
+    return dict(counts, donut=figures.DONUT_CLIENTSIDE)
+
+
+def build_snapshot(df, cube, static_figures):
+    # Indexes of df and cube. With a data service, which has them, only the values: cube is None, and the compact
+    # counts come with the figures of the service (fetch_static_figures).
+    if cube is None:
+        counts = static_figures['compact_counts'] if static_figures is not None else None
+        return Snapshot(df, None, static_figures, None, None, None, filter_values(df), compact_payload(counts))
+    return Snapshot(df, cube, static_figures, drilldown.DrillDownIndex(df), bitmaps.BitmapIndex(df),
+                    trends.GenderGap(cube), filter_values(df),
+                    compact_payload(cube.compact_counts() if CLIENTSIDE else None))
+
+
+def load():
+    global snapshot
+    # The CSV is parsed by chunks once, into a typed columnar snapshot and a cube snapshot that later boots and
+    # the other workers memory-map. A web worker with a data service only reads the columnar snapshot.
+    start = time.perf_counter()
+    if data_service.enabled:
+        df, cube = dataset.load_dataset(), None
+    else:
+        df, cube = aggregate.load_data()
+    startup_seconds['load_data'] = time.perf_counter() - start
+
+    static_figures = None
+    if not data_service.enabled:
+        start = time.perf_counter()
+        static_figures = figures.build_static_figures(cube)
+        startup_seconds['static_figures'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    snapshot = build_snapshot(df, cube, static_figures)
+    startup_seconds['indexes'] = time.perf_counter() - start
+    result_cache.use_namespace(df.attrs['fingerprint'])
+    bundles.source = df.attrs['fingerprint']
+
+
+# Opt-in timing of the callback stages + payload sizes, on /metrics in the Prometheus format
+metrics = Metrics(enabled=os.environ.get('OLYMPICS_METRICS') == '1')
+metrics.gauge('cache', 'Counters of the callback result cache', lambda: result_cache.stats())
+metrics.gauge('bundles', 'Lookups in the exported bundles', lambda: bundles.stats())
+metrics.gauge('process_memory_bytes', 'Memory of this worker, uss is what it does not share with the others',
+              lambda: dataset.process_memory())
+
+# gzip (or brotli) of the layout and the callback answers, with their sizes before and after on /metrics
+compression = Compression(enabled=os.environ.get('OLYMPICS_COMPRESSION', '1') == '1', metrics=metrics)
+
+# Opt-in process pool for the callback computations (OLYMPICS_POOL_PROCESSES=0 computes them in the web worker),
+# so a burst of heavy filters waits in a bounded queue and times out instead of holding every web worker.
+# The queue holds every filter callback once per process unless OLYMPICS_POOL_PENDING is set.
+compute_pool = ComputePool(processes=int(os.environ.get('OLYMPICS_POOL_PROCESSES', 0)),
+                           timeout=float(os.environ.get('OLYMPICS_POOL_TIMEOUT', 10)),
+                           max_pending=int(os.environ.get('OLYMPICS_POOL_PENDING', 0)) or None)
+metrics.gauge('compute_pool', 'Counters of the callback process pool', lambda: compute_pool.stats())
+
+# The calls of a callback superseded by a newer one from the same page are dropped before computing,
+# or cancelled while they wait for the pool
+sessions = Sessions()
+compute_pool.should_cancel = sessions.superseded
+metrics.gauge('sessions', 'Calls dropped because a newer one came from the same page', lambda: sessions.stats())
+
+
+def computations_saved():
+    # Callback calls answered without computing, by reason
+    cache, pool = result_cache.stats(), compute_pool.stats()
+    return dict(cache=cache['hits'] + cache['disk_hits'], single_flight=cache['shared'],
+                bundles=bundles.stats()['hits'], superseded=sessions.stats()['superseded'],
+                cancelled=pool['cancelled'])
+
+
+metrics.gauge('computations_saved', 'Callback calls answered without computing them', computations_saved)
+metrics.gauge('data_service', 'Requests of this worker to the data service', lambda: data_service.stats())
+metrics.gauge('startup_seconds', 'Time of each step of the warm-up of this worker', lambda: startup_seconds)
 
-path = 'https://raw.githubusercontent.com/HugodaSilva/DVizProject_OlympicGames_GenderRepresentation/master/'
-df = pd.read_csv(path + 'OlympicGames1896to2014.csv',
-                 quotechar='"',
-                 header=0,
-                 delimiter=",")
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- New Editions ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Medal rows of new Games dropped in dataset.EDITIONS_DIR are appended while the app keeps serving:
+# the cube and the heatmap only compute the new rows, and only the cached results they change are dropped.
+# A new cube / dataset / figures set is built aside and swapped in, callbacks already running keep the old one.
+
+ingest_lock = threading.Lock()
+# path -> (size, mtime) of the edition files appended, and of the ones that could not be read: those are skipped
+# until they change
+ingested_editions = {}
+failed_editions = {}
+EDITIONS_CHECK_SECONDS = float(os.environ.get('OLYMPICS_EDITIONS_CHECK_SECONDS', 5))
+editions_checked = [0.0]
+
+
+def ingest_edition(path):
+    global snapshot
+    data = snapshot
+    rows = dataset.read_edition(path)
+    years = set(int(year) for year in rows['Year'].unique())
+    countries = set(rows['Country_Name'].astype(str).unique())
+
+    df = dataset.append_rows(data.df, rows)
+    df.attrs['fingerprint'] = '{}+{}'.format(data.df.attrs['fingerprint'], dataset.csv_fingerprint(path)['sha1'])
+    if data_service.enabled:
+        # The figures are fetched once every new edition is in (fetch_static_figures)
+        snapshot = build_snapshot(df, None, data.static_figures)
+    else:
+        cube = data.cube.appended(rows)
+        snapshot = build_snapshot(df, cube, data.static_figures.updated(cube, years))
+
+    # Cached results of a filter covering one of the new Games and (all countries or) one of the new countries
+    def affected(key):
+        games, selected, _ = key[1]
+        return bool(games) and any(games[0] <= year <= games[1] for year in years) and \
+            (not selected or not countries.isdisjoint(selected))
+
+    result_cache.invalidate(affected)
+    # Entries on disk can't be listed by key, workers with the new edition use a new namespace instead
+    result_cache.use_namespace(df.attrs['fingerprint'])
+    # Bundles exported before the new edition are out of date
+    bundles.source = df.attrs['fingerprint']
+    # The pool processes were forked with the old data
+    compute_pool.restart()
+
+
+def ingest_new_editions():
+    # Appends the edition files not seen yet, at most once every EDITIONS_CHECK_SECONDS. An edition already
+    # appended that was rewritten or removed can't be taken out of the data: it is reloaded from the snapshot with
+    # the editions as they are now.
+    now = time.time()
+    if now - editions_checked[0] < EDITIONS_CHECK_SECONDS:
+        return
+    editions_checked[0] = now
+    with ingest_lock:
+        editions = dataset.list_editions()
+        current = {path: (size, mtime) for path, size, mtime in editions}
+        new_editions = False
+        if any(current.get(path) != stat for path, stat in ingested_editions.items()):
+            log.info('Edition files changed, reloading the data')
+            load()
+            ingested_editions.clear()
+            result_cache.invalidate(lambda key: True)
+            compute_pool.restart()
+            new_editions = True
+
+        for path, size, mtime in editions:
+            if path in ingested_editions or failed_editions.get(path) == (size, mtime):
+                continue
+            try:
+                ingest_edition(path)
+            except Exception:
+                # A broken file must not stop the app: it is skipped until it is replaced
+                log.exception('Edition %s could not be appended, skipped until it changes', path)
+                failed_editions[path] = (size, mtime)
+                continue
+            failed_editions.pop(path, None)
+            ingested_editions[path] = (size, mtime)
+            new_editions = True
+        if new_editions and data_service.enabled:
+            fetch_static_figures()
+
+
+def fetch_static_figures():
+    # Heatmap, swap bars and compact counts of the page built by the data service, for the data of this worker (its
+    # fingerprint)
+    global snapshot
+    static_figures = data_service.heatmap(snapshot.df.attrs['fingerprint'])
+    snapshot = snapshot._replace(static_figures=static_figures,
+                                 compact_counts=compact_payload(static_figures['compact_counts']))
+
+
+def warm_up():
+    # Data, figures, indexes and the editions appended since, once; concurrent first requests wait for it
+    if loaded.is_set():
+        return
+    with warm_up_lock:
+        if loaded.is_set():
+            return
+        load()
+        start = time.perf_counter()
+        ingest_new_editions()
+        startup_seconds['editions'] = time.perf_counter() - start
+        if data_service.enabled and snapshot.static_figures is None:
+            start = time.perf_counter()
+            fetch_static_figures()
+            startup_seconds['static_figures'] = time.perf_counter() - start
+        loaded.set()
+
+
+if not LAZY:
+    warm_up()
 
 # -------------------------------------------------------------------------------------------------------------------#
 # ------------------------------------------ Filters definition -----------------------------------------------------#
 # -------------------------------------------------------------------------------------------------------------------#
 
+# Built from the snapshot when the page is served, so new editions show up without a restart.
+# Before warm_up() (the layout checked by Dash in the lazy mode), no data, no options.
+
+def country_options(data):
+    if data is None:
+        return []
+    return [dict(label=country.replace('_', ' '), value=country) for country in sorted(data.values['Country_Name'])]
+
+
+def filter_options(data, column):
+    # Options of the Season, Sport, Discipline and Medal dropdowns
+    if data is None:
+        return []
+    return [dict(label=str(value), value=value) for value in data.values[column]]
 
-country_options = [dict(label=country.replace('_', ' '), value=country) for country in
-                   sorted(df['Country_Name'].unique())]
 
-dropdown_country = dcc.Dropdown(
-    id='country_drop',
-    options=country_options,
-    value=[],
-    multi=True
-)
+def year_marks(data):
+    # Every Games is a mark. Since 1992 the Summer and Winter Games alternate every 2 years, so within those
+    # runs every other label is left empty, always keeping the label of the last Games.
+    if data is None:
+        return {}
+    years = data.values['Year']
+    marks = {}
+    labelled_next = None
+    for i in range(len(years) - 1, -1, -1):
+        labelled = not (i + 1 < len(years) and years[i + 1] - years[i] == 2 and labelled_next)
+        marks[str(years[i])] = str(years[i]) if labelled else ''
+        labelled_next = labelled
+    return dict(sorted(marks.items()))
 
-# create years dict
-years_select = {str(i): '{}'.format(str(i)) for i in df['Year'].unique()}
-years_select[str(1892)] = "All"
 
 # -------------------------------------------------------------------------------------------------------------------#
 # --------------------------------------------------- APP -----------------------------------------------------------#
@@ -51,648 +338,705 @@ app = dash.Dash(__name__)
 
 server = app.server
 
-app.layout = html.Div([
-    html.Div([  # DIV A - LEFT COLUMN
-        html.Div([  # Div A1 - Logo and Text
-            html.Div([  # Div A1.1 - Logo
-                html.Img(
-                    src="assets/Olympic_Rings.png",
-                    alt="Olympic Games logo",
-                    id="logo",
-                    width="100%",
-                    height="100%",
-                ),
-            ], style={'vertical-align': 'middle', 'horizontal-align': 'middle'}),  # End Div A1.1
-            html.Div([  # Div A1.2 - Text
-                html.Div(['More than 35,000 medals have been awarded at the Olympics since 1896.'
-                          ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),
-                html.Div([
-                             'The information in this visualisation contains every Olympic athlete that has won a medal since the first games.'
-                             ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),
-            ], ),  # End Div A1.2
-        ], ),
-
-        html.Br(),
-
-        html.Div([  # Div A2 - Indicator Cards
-            html.Div([  # Div A2.1 - Number of Countries
-                html.Div('Number of Countries', style={"font-size": 15, "font-weight": "bold"}),
-                html.Br(),
-                html.Div('Total', style={"font-size": 14}),
-                dcc.Loading(html.Div([html.H4("...")], id="N_Country_Total_Filter",
-                                     style={"font-size": 16, "font-weight": "bold", 'color': 'grey'})),
-                html.Div([
-                    html.Div([
-                        html.Div('Men', style={"font-size": 14}),
-                        dcc.Loading(html.Div([html.H6("...")], id="N_Country_Gender_Men_Filter",
-                                             style={"font-size": 16, "font-weight": "bold", 'color': '#87CEFA'})),
-                    ], style={'width': '50%'}),
+# /healthz answers without the data, even before it is loaded
+server.wsgi_app = HealthCheck(server.wsgi_app, loaded.is_set)
+
+compression.install(server)
+metrics.install(server)
+
+
+@server.route('/cache_stats')
+def cache_stats():
+    return result_cache.stats()
+
+
+@server.before_request
+def check_new_editions():
+    # The first request of a lazy worker loads the data
+    warm_up()
+    ingest_new_editions()
+
+
+@server.errorhandler(PoolBusy)
+@server.errorhandler(PoolTimeout)
+@server.errorhandler(DataServiceError)
+def compute_pool_unavailable(error):
+    # The browser keeps the previous figures, the next change of the filters tries again
+    return 'Too many filters being computed, try again', 503, {'Retry-After': '1'}
+
+
+@server.errorhandler(PoolCancelled)
+def compute_cancelled(error):
+    # No content: Dash leaves the outputs as they are, the newer call answers them
+    return '', 204
+
+
+def filter_id(column):
+    return column.lower() + '_drop'
+
+
+def serve_layout():
+    # A function, so every page load gets the editions appended since the start.
+    # Dash also calls it to check the ids of the layout, when app.layout is set (no request yet: in the lazy mode
+    # the page is then built without the data) and on the first request, before the request hooks of the app.
+    if has_request_context():
+        warm_up()
+    data = snapshot if loaded.is_set() else None
+    years = data.values['Year'] if data is not None else [0]
+    return html.Div([
+        html.Div([  # DIV A - LEFT COLUMN
+            html.Div([  # Div A1 - Logo and Text
+                html.Div([  # Div A1.1 - Logo
+                    html.Img(
+                        src="assets/Olympic_Rings.png",
+                        alt="Olympic Games logo",
+                        id="logo",
+                        width="100%",
+                        height="100%",
+                    ),
+                ], style={'vertical-align': 'middle', 'horizontal-align': 'middle'}),  # End Div A1.1
+                html.Div([  # Div A1.2 - Text
+                    html.Div(['More than 35,000 medals have been awarded at the Olympics since 1896.'
+                              ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),
                     html.Div([
-                        html.Div('Women', style={"font-size": 14}),
-                        dcc.Loading(html.Div([html.H6("...")], id="N_Country_Gender_Women_Filter",
-                                             style={"font-size": 16, "font-weight": "bold", 'color': '#FFC0CB'})),
-                    ], style={'width': '50%'}),
-                ], style={'display': 'flex'}),
-                html.Br(),
-                html.Div([
-                    'Number of countries with Olympic medalists split by Gender. '
+                                 'The information in this visualisation contains every Olympic athlete that has won a medal since the first games.'
+                                 ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),
+                ], ),  # End Div A1.2
+            ], ),
 
-                ], style={'text-align': 'left', 'font-size': '0.5em', 'color': 'gray'}),
-            ], className='box',
-                style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
-            # End Div A2.1
+            html.Br(),
 
-            html.Div([  # Div A2.2 - Number of Athletes
-                html.Div('Number of Athletes', style={"font-size": 15, "font-weight": "bold"}),
-                html.Br(),
-                html.Div('Total', style={"font-size": 14}),
-                dcc.Loading(html.Div([html.H4("...")], id="N_Athletes_Total_Filter",
-                                     style={"font-size": 16, "font-weight": "bold", 'color': 'grey'})),
-                html.Div([
+            html.Div([  # Div A2 - Indicator Cards
+                html.Div([  # Div A2.1 - Number of Countries
+                    html.Div('Number of Countries', style={"font-size": 15, "font-weight": "bold"}),
+                    html.Br(),
+                    html.Div('Total', style={"font-size": 14}),
+                    dcc.Loading(html.Div([html.H4("...")], id="N_Country_Total_Filter",
+                                         style={"font-size": 16, "font-weight": "bold", 'color': 'grey'})),
+                    html.Div([
+                        html.Div([
+                            html.Div('Men', style={"font-size": 14}),
+                            dcc.Loading(html.Div([html.H6("...")], id="N_Country_Gender_Men_Filter",
+                                                 style={"font-size": 16, "font-weight": "bold", 'color': '#87CEFA'})),
+                        ], style={'width': '50%'}),
+                        html.Div([
+                            html.Div('Women', style={"font-size": 14}),
+                            dcc.Loading(html.Div([html.H6("...")], id="N_Country_Gender_Women_Filter",
+                                                 style={"font-size": 16, "font-weight": "bold", 'color': '#FFC0CB'})),
+                        ], style={'width': '50%'}),
+                    ], style={'display': 'flex'}),
+                    html.Br(),
+                    html.Div([
+                        'Number of countries with Olympic medalists split by Gender. '
+
+                    ], style={'text-align': 'left', 'font-size': '0.5em', 'color': 'gray'}),
+                ], className='box',
+                    style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
+                # End Div A2.1
+
+                html.Div([  # Div A2.2 - Number of Athletes
+                    html.Div('Number of Athletes', style={"font-size": 15, "font-weight": "bold"}),
+                    html.Br(),
+                    html.Div('Total', style={"font-size": 14}),
+                    dcc.Loading(html.Div([html.H4("...")], id="N_Athletes_Total_Filter",
+                                         style={"font-size": 16, "font-weight": "bold", 'color': 'grey'})),
+                    html.Div([
+                        html.Div([
+                            html.Div('Men', style={"font-size": 14}),
+                            dcc.Loading(html.Div([html.H6("...")], id="N_Athletes_Gender_Men_Filter",
+                                                 style={"font-size": 16, "font-weight": "bold", 'color': '#87CEFA'})),
+                        ], style={'width': '50%'}),
+                        html.Div([
+                            html.Div('Women', style={"font-size": 14}),
+                            dcc.Loading(html.Div([html.H6("...")], id="N_Athletes_Gender_Women_Filter",
+                                                 style={"font-size": 16, "font-weight": "bold", 'color': '#FFC0CB'})),
+                        ], style={'width': '50%'}),
+                    ], style={'display': 'flex'}),
+                    html.Br(),
+                    html.Div([
+                        'Number of Olympic medalists & Olympic medalists split by Gender. '
+                    ], style={'text-align': 'left', 'font-size': '0.5em', 'color': 'gray'}),
+                ], className='box',
+                    style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
+                # End Div A2.2
+
+                html.Div([  # Div A2.3 - Number of Sports
+                    html.Div('Number of Sports', style={"font-size": 15, "font-weight": "bold"}),
+                    html.Br(),
+                    html.Div('Total', style={"font-size": 14}),
+                    dcc.Loading(html.Div([html.H4("...")], id="N_Sports_Total_Filter",
+                                         style={"font-size": 16, "font-weight": "bold", 'color': 'grey'})),
                     html.Div([
-                        html.Div('Men', style={"font-size": 14}),
-                        dcc.Loading(html.Div([html.H6("...")], id="N_Athletes_Gender_Men_Filter",
-                                             style={"font-size": 16, "font-weight": "bold", 'color': '#87CEFA'})),
-                    ], style={'width': '50%'}),
+                        html.Div([
+                            html.Div('Men', style={"font-size": 14}),
+                            dcc.Loading(html.Div([html.H6("...")], id="N_Sports_Gender_Men_Filter",
+                                                 style={"font-size": 16, "font-weight": "bold", 'color': '#87CEFA'})),
+                        ], style={'width': '50%'}),
+                        html.Div([
+                            html.Div('Women', style={"font-size": 14}),
+                            dcc.Loading(html.Div([html.H6("...")], id="N_Sports_Gender_Women_Filter",
+                                                 style={"font-size": 16, "font-weight": "bold", 'color': '#FFC0CB'})),
+                        ], style={'width': '50%'}),
+                    ], style={'display': 'flex'}),
+                    html.Br(),
                     html.Div([
-                        html.Div('Women', style={"font-size": 14}),
-                        dcc.Loading(html.Div([html.H6("...")], id="N_Athletes_Gender_Women_Filter",
-                                             style={"font-size": 16, "font-weight": "bold", 'color': '#FFC0CB'})),
-                    ], style={'width': '50%'}),
-                ], style={'display': 'flex'}),
+                        'Number of Sports with Olympic medalists split by Gender.'
+                    ], style={'text-align': 'left', 'font-size': '0.5em', 'color': 'gray'}),
+                ], className='box',
+                    style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
+                # End Div A2.3
+            ], style={'display': 'flex', 'flex-direction': 'column'}),  # End Div A2
+        ], className='column_1'),  # End DIV A
+
+        html.Div([  # DIV B - RIGHT COLUMN
+            html.Div([  # Div B1 - Title and SubTitle
+                html.Div([  # Div B1.1 - Title
+                    html.H1('Do the Olympic Games have a gender gap?'),
+                ], style={'text-align': 'center', 'color': '#4c8bf5'}),  # End Div B1.1
+                html.Div([  # Div B1.2 - SubTitle
+                    html.H3(
+                        'Olympic Medals as a medium to understand the underrepresentation of female athletes in the Olympics '
+                        '({} to {})'.format(years[0], years[-1])),
+                ], style={'text-align': 'center', 'color': '#4c8bf5'}),  # End Div B1.2
+            ], ),  # End Div B1
+
+            html.Div([  # Div B2 - Filters Menu
+                html.Div([  # Div B2.1 - Title
+                    html.H4('Select Country and/or Year below for more detailed information'),
+                ], style={'width': '80%', 'display': 'inline-block', 'vertical-align': 'middle'}),  # End Div B2.1
+
                 html.Br(),
-                html.Div([
-                    'Number of Olympic medalists & Olympic medalists split by Gender. '
-                ], style={'text-align': 'left', 'font-size': '0.5em', 'color': 'gray'}),
-            ], className='box',
-                style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
-            # End Div A2.2
-
-            html.Div([  # Div A2.3 - Number of Sports
-                html.Div('Number of Sports', style={"font-size": 15, "font-weight": "bold"}),
+
+                html.Div([  # Div B2.2 - Country Dropdown
+                    html.Label('Country'),
+                    dcc.Dropdown(
+                        id='country_drop',
+                        options=country_options(data),
+                        value=[],
+                        multi=True
+                    ),
+                ], style={'width': '50%', 'display': 'inline-block'}),  # End Div B2.2
+
                 html.Br(),
-                html.Div('Total', style={"font-size": 14}),
-                dcc.Loading(html.Div([html.H4("...")], id="N_Sports_Total_Filter",
-                                     style={"font-size": 16, "font-weight": "bold", 'color': 'grey'})),
-                html.Div([
+                html.Br(),
+
+                html.Div([  # Div B2.3 - Year Slider
+                    html.Label('Year'),
                     html.Div([
-                        html.Div('Men', style={"font-size": 14}),
-                        dcc.Loading(html.Div([html.H6("...")], id="N_Sports_Gender_Men_Filter",
-                                             style={"font-size": 16, "font-weight": "bold", 'color': '#87CEFA'})),
-                    ], style={'width': '50%'}),
+                        dcc.RangeSlider(
+                            id='year_slider',
+                            min=years[0],
+                            max=years[-1],
+                            value=[years[0], years[-1]],
+                            marks=year_marks(data),
+                            step=None,
+                            # Dragging doesn't send the intermediate marks, the filter changes on release
+                            updatemode='mouseup'
+                        )
+                    ], id='slider'),
+                    html.Br(),
+                ], style={'width': '100%', 'display': 'inline-block'}),  # End Div B2.3
+
+                html.Div([  # Div B2.4 - Season, Sport, Discipline and Medal Dropdowns
                     html.Div([
-                        html.Div('Women', style={"font-size": 14}),
-                        dcc.Loading(html.Div([html.H6("...")], id="N_Sports_Gender_Women_Filter",
-                                             style={"font-size": 16, "font-weight": "bold", 'color': '#FFC0CB'})),
-                    ], style={'width': '50%'}),
-                ], style={'display': 'flex'}),
+                        html.Label(column),
+                        dcc.Dropdown(
+                            id=filter_id(column),
+                            options=filter_options(data, column),
+                            value=[],
+                            multi=True
+                        ),
+                    ], style={'width': '25%', 'display': 'inline-block'})
+                    for column in EXTRA_FILTERS
+                    # The clientside mode only knows the years and the countries
+                ], style={'display': 'none'} if CLIENTSIDE else {'display': 'flex'}),  # End Div B2.4
+            ], className='box'),  # End Div B2
+
+            html.Div([  # Div B3 - Gender Percentage
+                html.Div([  # Div B3.1 - Title
+                    html.H3('The gap'),
+                    html.H5('More than 100 years later, gender equality still is not a reality in the Olympic Games.'),
+                    'Use the Filter Menu and hover over the graphs to find the gap between men and women Olympic medalists',
+                ]),  # End Div B3.1
+
+                html.Div([  # Div B3.2 - Pie Chart
+                    dcc.Loading(dcc.Graph(id='Gender_Percentage'))
+                ]),  # End Div B3.2
                 html.Br(),
-                html.Div([
-                    'Number of Sports with Olympic medalists split by Gender.'
-                ], style={'text-align': 'left', 'font-size': '0.5em', 'color': 'gray'}),
-            ], className='box',
-                style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
-            # End Div A2.3
-        ], style={'display': 'flex', 'flex-direction': 'column'}),  # End Div A2
-    ], className='column_1'),  # End DIV A
-
-    html.Div([  # DIV B - RIGHT COLUMN
-        html.Div([  # Div B1 - Title and SubTitle
-            html.Div([  # Div B1.1 - Title
-                html.H1('Do the Olympic Games have a gender gap?'),
-            ], style={'text-align': 'center', 'color': '#4c8bf5'}),  # End Div B1.1
-            html.Div([  # Div B1.2 - SubTitle
-                html.H3(
-                    'Olympic Medals as a medium to understand the underrepresentation of female athletes in the Olympics (1896 to 2014)'),
-            ], style={'text-align': 'center', 'color': '#4c8bf5'}),  # End Div B1.2
-        ], ),  # End Div B1
-
-        html.Div([  # Div B2 - Filters Menu
-            html.Div([  # Div B2.1 - Title
-                html.H4('Select Country and/or Year below for more detailed information'),
-            ], style={'width': '80%', 'display': 'inline-block', 'vertical-align': 'middle'}),  # End Div B2.1
 
-            html.Br(),
+                html.Div([  # Div B3.3 - Bar Chart
+                    dcc.Loading(dcc.Graph(id='Gender_Year'))
+                ]),  # End Div B3.3
+                html.Br(),
 
-            html.Div([  # Div B2.2 - Country Dropdown
-                html.Label('Country'),
-                dropdown_country,
-            ], style={'width': '50%', 'display': 'inline-block'}),  # End Div B2.2
+                html.Div([  # Div B3.4 - Gender Gap Trend
+                    dcc.Loading(dcc.Graph(id='Gender_Gap'))
+                ]),  # End Div B3.4
+                html.Br(),
 
-            html.Br(),
+                html.Div([  # Div B3.5 - Country Comparison
+                    html.H5('Countries side by side'),
+                    'Select two or more countries in the Filter Menu to compare them',
+                    dcc.Loading(dcc.Graph(id='Country_Kpis')),
+                    dcc.Loading(dcc.Graph(id='Country_Comparison')),
+                ]),  # End Div B3.5
+                html.Br(),
+            ], className='box'),  # End Div B3
+
+            html.Div([  # Div B4 - Gender Participation
+                html.Div([  # Div B4.1 - Title
+                    html.H3('The changing path'),
+                    html.H5('Women have not always been allowed to participate in the Olympic Games. '),
+                    'In 1900, women competed in two mixed events - tennis and golf. '
+                    'Like women participation, the number of events in the Olyimpics has steadily increased over time.'
+                ]),  # End Div B4.1
+
+                html.Div([  # Div B4.2 -Stacked 100%
+                    dcc.Graph(id='Gender_Swap', figure=data.static_figures['Gender_Swap'] if data is not None else {}),
+                ], style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
+                # End Div B4.2
+                html.Div('With some notable landmarks worth noting: in 2000, in Sydney, women weightlifting was included.'),
+                html.Div('This move was followed, four years later, by wrestling and fencing in Athens. Women boxed for the first time in 2012.'),
+                html.Div('As additional notes, it is also worth pointing out that in the London Games 2012, for the first time ever, there was at least one woman in every delegation.'),
+                html.Div('As for the one event discriminating against men - softball -, there is still no calendar for it to become a mixed sport.'),
+                html.Div([  # Div B4.3 - Heatmap
+                    dcc.Graph(id='Gender_Participation', figure=data.static_figures['Gender_Participation'] if data is not None else {}),
+                ], style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
+                # End Div B4.3
+            ], className='box'),  # End Div B4
             html.Br(),
 
-            html.Div([  # Div B2.3 - Year Slider
-                html.Label('Year'),
-                html.Div([
-                    dcc.RangeSlider(
-                        id='year_slider',
-                        min=1896,
-                        max=2014,
-                        value=[1896, 2014],
-                        marks={'1896': '1896',
-                               '1900': '1900',
-                               '1904': '1904',
-                               '1908': '1908',
-                               '1912': '1912',
-                               '1920': '1920',
-                               '1924': '1924',
-                               '1928': '1928',
-                               '1932': '1932',
-                               '1936': '1936',
-                               '1948': '1948',
-                               '1952': '1952',
-                               '1956': '1956',
-                               '1960': '1960',
-                               '1964': '1964',
-                               '1968': '1968',
-                               '1972': '1972',
-                               '1976': '1976',
-                               '1980': '1980',
-                               '1984': '1984',
-                               '1988': '1988',
-                               '1992': '',
-                               '1994': '1994',
-                               '1996': '',
-                               '1998': '1998',
-                               '2000': '',
-                               '2002': '2002',
-                               '2004': '',
-                               '2006': '2006',
-                               '2008': '',
-                               '2010': '2010',
-                               '2012': '',
-                               '2014': '2014', },
-                        step=None
-                    )
-                ], id='slider'),
+            html.Div([  # Div B5 - Drill-down
+                html.Div([  # Div B5.1 - Title
+                    html.H3('A closer look'),
+                    'Click a cell of the heatmap or a bar of the medals per year to list the medals behind it. '
+                    'Type the name of an athlete, an event or a discipline to narrow the list.'
+                ]),  # End Div B5.1
+                html.Br(),
+                html.Div([  # Div B5.2 - Search
+                    dcc.Input(id='drill_search', type='text', placeholder='Athlete, event or discipline',
+                              debounce=True, style={'width': '50%'}),
+                ]),  # End Div B5.2
                 html.Br(),
-            ], style={'width': '100%', 'display': 'inline-block'}),  # End Div B2.3
-        ], className='box'),  # End Div B2
-
-        html.Div([  # Div B3 - Gender Percentage
-            html.Div([  # Div B3.1 - Title
-                html.H3('The gap'),
-                html.H5('More than 100 years later, gender equality still is not a reality in the Olympic Games.'),
-                'Use the Filter Menu and hover over the graphs to find the gap between men and women Olympic medalists',
-            ]),  # End Div B3.1
-
-            html.Div([  # Div B3.2 - Pie Chart
-                dcc.Loading(dcc.Graph(id='Gender_Percentage'))
-            ]),  # End Div B3.2
+                dcc.Loading(html.Div(id='drill_panel')),  # Div B5.3 - Medals
+                dcc.Store(id='drill_selection'),
+            ], className='box'),  # End Div B5
             html.Br(),
 
-            html.Div([  # Div B3.3 - Bar Chart
-                dcc.Loading(dcc.Graph(id='Gender_Year'))
-            ]),  # End Div B3.3
-            html.Br(),
-        ], className='box'),  # End Div B3
-
-        html.Div([  # Div B4 - Gender Participation
-            html.Div([  # Div B4.1 - Title
-                html.H3('The changing path'),
-                html.H5('Women have not always been allowed to participate in the Olympic Games. '),
-                'In 1900, women competed in two mixed events - tennis and golf. '
-                'Like women participation, the number of events in the Olyimpics has steadily increased over time.'
-            ]),  # End Div B4.1
-
-            html.Div([  # Div B4.2 -Stacked 100%
-                dcc.Graph(id='Gender_Swap'),
-            ], style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
-            # End Div B4.2
-            html.Div('With some notable landmarks worth noting: in 2000, in Sydney, women weightlifting was included.'),
-            html.Div('This move was followed, four years later, by wrestling and fencing in Athens. Women boxed for the first time in 2012.'),
-            html.Div('As additional notes, it is also worth pointing out that in the London Games 2012, for the first time ever, there was at least one woman in every delegation.'),
-            html.Div('As for the one event discriminating against men - softball -, there is still no calendar for it to become a mixed sport.'),
-            html.Div([  # Div B4.3 - Heatmap
-                dcc.Graph(id='Gender_Participation'),
-            ], style={'text-align': 'center', 'vertical-align': 'middle', 'horizontal-align': 'middle'}),
-            # End Div B4.3
-        ], className='box'),  # End Div B4
-        html.Br(),
-
-        html.Div([  # Div B5 - Footer
-            html.Div([  # Div B5.1 - School
-                'NOVA IMS | Data Visualisation | Spring Semester 2019-2020'
-            ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),  # End Div B5.1
-            html.Div([  # Div B5.2 - Professors
-                'Professors: Pedro Cabral | Nuno Alpalhão'
-            ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),  # End Div B5.2
-            html.Div([  # Div B5.3 - Group
-                'Group: Anabell Gongora M20180349 | Hugo Silva M20190973 | Joana Ribeiro M20190459 | Liliana Nogueira M20190835'
-            ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),  # End Div B5.3
-        ], className='box'),  # End Div B5
-    ], className='column_2'),  # end DIV B
-
-], style={'display': 'flex'})
+            html.Div([  # Div B6 - Footer
+                html.Div([  # Div B6.1 - School
+                    'NOVA IMS | Data Visualisation | Spring Semester 2019-2020'
+                ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),  # End Div B6.1
+                html.Div([  # Div B6.2 - Professors
+                    'Professors: Pedro Cabral | Nuno Alpalhão'
+                ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),  # End Div B6.2
+                html.Div([  # Div B6.3 - Group
+                    'Group: Anabell Gongora M20180349 | Hugo Silva M20190973 | Joana Ribeiro M20190459 | Liliana Nogueira M20190835'
+                ], style={'text-align': 'center', 'font-size': '0.8em', 'color': 'gray'}),  # End Div B6.3
+            ], className='box'),  # End Div B6
+        ], className='column_2'),  # end DIV B
+
+        dcc.Store(id='compact_counts', data=data.compact_counts if data is not None else None),
+        dcc.Store(id='page_id', data=sessions.new_page()),
+
+    ], style={'display': 'flex'})
+
+
+app.layout = serve_layout
 
 
 # -------------------------------------------------------------------------------------------------------------------#
 # -------------------------------------------- Plots Creation -------------------------------------------------------#
 # -------------------------------------------------------------------------------------------------------------------#
 
-@app.callback([
+# Every card and chart has its own callback: each one is sent to the browser as soon as it is computed,
+# and the slower charts don't hold back the indicator cards.
+# All of them read the same slices of the aggregate cube, selected once per filter in cube.selection. When a
+# Season, Sport, Discipline or Medal is picked, they read the same rows of the bitmap index instead.
+
+FILTER_INPUTS = [
+    Input("year_slider", "value"),
+    Input("country_drop", "value"),
+] + [Input(filter_id(column), "value") for column in EXTRA_FILTERS]
+
+
+def filter_callback(outputs, clientside=None):
+    # Server callback of the filters. In the clientside mode, the outputs that have a clientside function in
+    # assets/clientside.js are computed by the browser instead, the server function stays for update_graphs.
+    # Dash also sends the id of the page, for sessions.track; the function returned takes the filters only.
+    def decorator(function):
+        if CLIENTSIDE and clientside:
+            app.clientside_callback(ClientsideFunction(namespace='olympics', function_name=clientside),
+                                    outputs, FILTER_INPUTS[:2] + [State('compact_counts', 'data')])
+            return function
+        app.callback(outputs, FILTER_INPUTS + [State('page_id', 'data')])(sessions.page(function))
+        return function
+
+    return decorator
+
+
+def extra_filters(filters):
+    # {column: values} of the Season, Sport, Discipline and Medal dropdowns that are set
+    return {column: values for column, values in zip(EXTRA_FILTERS, filters) if values}
+
+
+def select(data, year, country, filters=()):
+    # Year slice + country index of the cube (or rows of the bitmap index), computed once and shared by every
+    # callback of the same filter
+    if data_service.enabled:
+        return
+    with metrics.stage('filter'):
+        extra = extra_filters(filters)
+        if extra:
+            data.bitmap_index.rows(year, country, **extra)
+        else:
+            data.cube.selection(year, country)
+
+
+def query(data, name, year, country, filters=()):
+    # Answer of the cube, or of the bitmap index for the filters the cube doesn't have (or of the data service)
+    if data_service.enabled:
+        return data_service.query(name, year, country, filters, data.df.attrs['fingerprint'])
+    extra = extra_filters(filters)
+    if extra:
+        return getattr(data.bitmap_index, name)(data.bitmap_index.rows(year, country, **extra))
+    return getattr(data.cube, name)(year, country)
+
+
+def filter_key(year, country, *filters):
+    # Canonical form of the filters: the Games actually inside the year range + the sorted set of countries
+    # + the sorted values of the other filters that are set
+    years = snapshot.values['Year']
+    start, end = dataset.year_range(years, year)
+    years = (years[start], years[end - 1]) if end > start else ()
+    extra = tuple((column, tuple(sorted(set(values)))) for column, values in extra_filters(filters).items())
+    return years, tuple(sorted(set(country or []))), extra
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                   Indicators 1  - Number of Countries
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+@filter_callback([
     Output('N_Country_Total_Filter', 'children'),
     Output('N_Country_Gender_Men_Filter', 'children'),
     Output('N_Country_Gender_Women_Filter', 'children'),
-    Output('N_Athletes_Total_Filter', 'children'),
-    Output('N_Athletes_Gender_Men_Filter', 'children'),
-    Output('N_Athletes_Gender_Women_Filter', 'children'),
-    Output('N_Sports_Total_Filter', 'children'),
-    Output('N_Sports_Gender_Men_Filter', 'children'),
-    Output('N_Sports_Gender_Women_Filter', 'children'),
-    Output('Gender_Percentage', 'figure'),
-    Output('Gender_Year', 'figure'),
-    Output('Gender_Participation', 'figure'),
-    Output('Gender_Swap', 'figure')
-],
-    [
-        Input("year_slider", "value"),
-        Input("country_drop", "value"),
-    ]
-)
-def update_graphs(year, country):
-    # ___________________________________________________________________________________________________________________#
-    #                                     Filter Data acording to the user inputs
-    # ___________________________________________________________________________________________________________________#
-
-    # -- Step 1 - Filter Dataframe
-    df_baseline = df[(df['Year'] >= year[0]) & (df['Year'] <= year[1])]
-
-    if country == []:
-        df_baseline = df_baseline.copy()
-    elif country != []:
-        df_baseline = df_baseline[df_baseline['Country_Name'].isin(country)].copy()
-
-    # ___________________________________________________________________________________________________________________#
-    #                                               Define the Graphs
-    # ___________________________________________________________________________________________________________________#
-
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                   Indicators 1  - Number of Countries
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+], clientside='countryIndicators')
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_country_indicators(year, country, *filters):
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
     # -- Step 2 - Prepare Data to Plot
-    N_Country_Total_Filter = df_baseline['Country_Name'].nunique()
-    N_Country_Gender_Filter = pd.pivot_table(df_baseline, values='Medal', index=['Country_Name'], columns=['Gender'],
-                                             aggfunc=len,
-                                             dropna=False)
-    N_Country_Gender_Split_Filter = N_Country_Gender_Filter.count()
-    if len(N_Country_Gender_Split_Filter) == 2:
-        N_Country_Gender_Men_Filter = N_Country_Gender_Split_Filter['Men']
-        N_Country_Gender_Women_Filter = N_Country_Gender_Split_Filter['Women']
-    elif N_Country_Gender_Split_Filter.index == 'Men':
-        N_Country_Gender_Men_Filter = N_Country_Gender_Split_Filter['Men']
-        N_Country_Gender_Women_Filter = 0
-    elif N_Country_Gender_Split_Filter.index == 'Women':
-        N_Country_Gender_Women_Filter = N_Country_Gender_Split_Filter['Women']
-        N_Country_Gender_Men_Filter = 0
-    else:
-        N_Country_Gender_Men_Filter = 0
-        N_Country_Gender_Women_Filter = 0
+    with metrics.stage('kpi_countries'):
+        N_Country_Total_Filter, N_Country_Gender_Split_Filter = query(data, 'countries_per_gender', year, country,
+                                                                      filters)
+    N_Country_Gender_Men_Filter = N_Country_Gender_Split_Filter.get('Men', 0)
+    N_Country_Gender_Women_Filter = N_Country_Gender_Split_Filter.get('Women', 0)
 
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                   Indicators 2  - Number of Countries
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+    return N_Country_Total_Filter, N_Country_Gender_Men_Filter, N_Country_Gender_Women_Filter
 
-    # -- Step 2 - Prepare Data to Plot
-    N_Athletes_Total_Filter = df_baseline['Athlete'].nunique()
-    N_Athletes_Gender_Filter = pd.pivot_table(df_baseline, values='Medal', index=['Athlete'], columns=['Gender'],
-                                              aggfunc=len,
-                                              dropna=False)
-    N_Athletes_Gender_Split_Filter = N_Athletes_Gender_Filter.count()
-    if len(N_Athletes_Gender_Split_Filter) == 2:
-        N_Athletes_Gender_Men_Filter = N_Athletes_Gender_Split_Filter['Men']
-        N_Athletes_Gender_Women_Filter = N_Athletes_Gender_Split_Filter['Women']
-    elif N_Athletes_Gender_Split_Filter.index == 'Men':
-        N_Athletes_Gender_Men_Filter = N_Athletes_Gender_Split_Filter['Men']
-        N_Athletes_Gender_Women_Filter = 0
-    elif N_Athletes_Gender_Split_Filter.index == 'Women':
-        N_Athletes_Gender_Women_Filter = N_Athletes_Gender_Split_Filter['Women']
-        N_Athletes_Gender_Men_Filter = 0
-    else:
-        N_Athletes_Gender_Men_Filter = 0
-        N_Athletes_Gender_Women_Filter = 0
 
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                   Indicators 3  - Number of Sports
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                   Indicators 2  - Number of Athletes
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+@filter_callback([
+    Output('N_Athletes_Total_Filter', 'children'),
+    Output('N_Athletes_Gender_Men_Filter', 'children'),
+    Output('N_Athletes_Gender_Women_Filter', 'children'),
+])
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_athletes_indicators(year, country, *filters):
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
     # -- Step 2 - Prepare Data to Plot
-    N_Sports_Total_Filter = df_baseline['Sport'].nunique()
-    N_Sports_Gender_Filter = pd.pivot_table(df_baseline, values='Medal', index=['Sport'], columns=['Gender'],
-                                            aggfunc=len,
-                                            dropna=False)
-    N_Sports_Gender_Split_Filter = N_Sports_Gender_Filter.count()
-    if len(N_Sports_Gender_Split_Filter) == 2:
-        N_Sports_Gender_Men_Filter = N_Sports_Gender_Split_Filter['Men']
-        N_Sports_Gender_Women_Filter = N_Sports_Gender_Split_Filter['Women']
-    elif N_Sports_Gender_Split_Filter.index == 'Men':
-        N_Sports_Gender_Men_Filter = N_Sports_Gender_Split_Filter['Men']
-        N_Sports_Gender_Women_Filter = 0
-    elif N_Sports_Gender_Split_Filter.index == 'Women':
-        N_Sports_Gender_Women_Filter = N_Sports_Gender_Split_Filter['Women']
-        N_Sports_Gender_Men_Filter = 0
-    else:
-        N_Sports_Gender_Men_Filter = 0
-        N_Sports_Gender_Women_Filter = 0
+    with metrics.stage('kpi_athletes'):
+        N_Athletes_Total_Filter, N_Athletes_Gender_Split_Filter = query(data, 'athletes_per_gender', year, country,
+                                                                        filters)
+    N_Athletes_Gender_Men_Filter = N_Athletes_Gender_Split_Filter.get('Men', 0)
+    N_Athletes_Gender_Women_Filter = N_Athletes_Gender_Split_Filter.get('Women', 0)
 
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                        Plot 1  - Gender Representation Olympic Games
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+    return N_Athletes_Total_Filter, N_Athletes_Gender_Men_Filter, N_Athletes_Gender_Women_Filter
 
-    # -- Step 2 - Prepare Data to Plot
 
-    # Define the labels
-    label_Gender = df_baseline["Gender"].value_counts().keys().tolist()
-    # Define the values
-    value_Gender = df_baseline["Gender"].value_counts().values.tolist()
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                   Indicators 3  - Number of Sports
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
 
-    Error_Message = 0
-    data_Gender = dict(type='pie', labels=label_Gender, values=value_Gender, marker_colors=['#87CEFA', '#FFC0CB'],
-                       hole=0.60)
+@filter_callback([
+    Output('N_Sports_Total_Filter', 'children'),
+    Output('N_Sports_Gender_Men_Filter', 'children'),
+    Output('N_Sports_Gender_Women_Filter', 'children'),
+], clientside='sportsIndicators')
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_sports_indicators(year, country, *filters):
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
-    if value_Gender == []:
-        Error_Message = 1
+    # -- Step 2 - Prepare Data to Plot
+    with metrics.stage('kpi_sports'):
+        N_Sports_Total_Filter, N_Sports_Gender_Split_Filter = query(data, 'sports_per_gender', year, country,
+                                                                    filters)
+    N_Sports_Gender_Men_Filter = N_Sports_Gender_Split_Filter.get('Men', 0)
+    N_Sports_Gender_Women_Filter = N_Sports_Gender_Split_Filter.get('Women', 0)
+
+    return N_Sports_Total_Filter, N_Sports_Gender_Men_Filter, N_Sports_Gender_Women_Filter
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Plot 1  - Gender Representation Olympic Games
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+@filter_callback(Output('Gender_Percentage', 'figure'), clientside='genderPercentage')
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_gender_percentage(year, country, *filters):
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
-    if Error_Message != 1:
-        layout_Gender = dict(title=dict(text='Gender Percentage')
-                             )
-    else:
-        layout_Gender = dict(title=dict(text='Gender Percentage'),
-                             yaxis=dict(visible=False),
-                             xaxis=dict(visible=False),
-                             annotations=[dict(text='No matching data found',
-                                               xref="paper",
-                                               yref="paper",
-                                               showarrow=False,
-                                               font=dict(size=12))
-                                          ]
-                             )
+    # -- Step 2 - Prepare Data to Plot
+    with metrics.stage('donut'):
+        medals_per_gender = query(data, 'medals_per_gender', year, country, filters)
 
     # -- Step 3 - Plot the Figure
-    fig_Gender_Percentage = go.Figure(data=[data_Gender], layout=layout_Gender)
+    with metrics.stage('figure_build'):
+        return figures.gender_percentage_figure(medals_per_gender)
 
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                        Plot 2  - Gender Representation per Year
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
 
-    # -- Step 2 - Prepare Data to Plot
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Plot 2  - Gender Representation per Year
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
 
-    df_GenderPerYear = pd.pivot_table(df_baseline, values="Athlete", index=["Year"], columns=["Gender"], aggfunc=len)
-
-    Error_Message = 0
-    if len(df_GenderPerYear.columns) == 2:
-        data_Men = (dict(type='bar',
-                         x=df_GenderPerYear.index,
-                         y=df_GenderPerYear['Men'],
-                         text=df_GenderPerYear['Men'],
-                         textposition='auto',
-                         name="Men",
-                         marker_color="#87CEFA",
-                         hovertemplate="Year: <b>%{x}</b><br>" +
-                                       "Number of Medals: <b>%{y}</b><br>" +
-                                       "Gender: <b>Men</b><br>",
-                         )
-                    )
-
-        data_Women = (dict(type='bar',
-                           x=df_GenderPerYear.index,
-                           y=df_GenderPerYear['Women'],
-                           text=df_GenderPerYear['Women'],
-                           textposition='auto',
-                           name="Women",
-                           marker_color="#FFC0CB",
-                           hovertemplate="Year: <b>%{x}</b><br>" +
-                                         "Number of Medals: <b>%{y}</b><br>" +
-                                         "Gender: <b>Women</b><br>",
-                           )
-                      )
-        data_bar = [data_Men, data_Women]
-
-    elif df_GenderPerYear.columns == 'Men':
-        data_Men = (dict(type='bar',
-                         x=df_GenderPerYear.index,
-                         y=df_GenderPerYear['Men'],
-                         text=df_GenderPerYear['Men'],
-                         textposition='auto',
-                         name="Men",
-                         marker_color="#87CEFA",
-                         hovertemplate="Year: <b>%{x}</b><br>" +
-                                       "Number of Medals: <b>%{y}</b><br>" +
-                                       "Gender: <b>Men</b><br>",
-                         )
-                    )
-        data_bar = data_Men
-
-    elif df_GenderPerYear.columns == 'Women':
-        data_Women = (dict(type='bar',
-                           x=df_GenderPerYear.index,
-                           y=df_GenderPerYear['Women'],
-                           text=df_GenderPerYear['Women'],
-                           textposition='auto',
-                           name="Women",
-                           marker_color="#FFC0CB",
-                           hovertemplate="Year: <b>%{x}</b><br>" +
-                                         "Number of Medals: <b>%{y}</b><br>" +
-                                         "Gender: <b>Women</b><br>",
-                           )
-                      )
-        data_bar = data_Women
+@filter_callback(Output('Gender_Year', 'figure'))
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_gender_year(year, country, *filters):
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
-    else:
-        data_bar = []
-        Error_Message = 1
-
-    # Define the Layout
-    if Error_Message != 1:
-        layout_bar = dict(title=dict(text='Number of Medals per Gender'),
-                          yaxis=dict(title='Number of Medals', tickfont=dict(size=9)),
-                          xaxis=dict(title="Year", tickfont=dict(size=9)),
-                          )
-    else:
-        layout_bar = dict(title=dict(text='Number of Medals per Gender'),
-                          yaxis=dict(visible=False),
-                          xaxis=dict(visible=False),
-                          annotations=[dict(text='No matching data found',
-                                            xref="paper",
-                                            yref="paper",
-                                            showarrow=False,
-                                            font=dict(size=12))
-                                       ]
-                          )
+    # -- Step 2 - Prepare Data to Plot
+    with metrics.stage('bar'):
+        df_GenderPerYear = query(data, 'medals_per_year', year, country, filters)
 
     # -- Step 3 - Plot the Figure
+    with metrics.stage('figure_build'):
+        return figures.gender_year_figure(df_GenderPerYear)
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Plot 3  - Gender Gap Trend
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+def gender_gap_trend(data, year, country, filters=()):
+    # Prefix sums of the cube for the Year x Country (x Sport) filters. With the other filters, of the medals of
+    # the bitmap rows over every Games: the first women's medal of a sport may come before the year range.
+    if data_service.enabled:
+        return data_service.query('gender_gap_trend', year, country, filters, data.df.attrs['fingerprint'])
+    extra = extra_filters(filters)
+    if set(extra) <= {'Sport'}:
+        return data.gender_gap.trend(year, country, extra.get('Sport'))
+    bitmap_index = data.bitmap_index
+    everything = bitmap_index.rows((data.cube.years[0], data.cube.years[-1]), country, **extra)
+    prefix = trends.prefix_sums(bitmap_index.medals_per_games_sport(everything))
+    years = bitmap_index.values['Year']
+    start, end = dataset.year_range(years, year)
+    return trends.trend_table(prefix[start:end + 1], years[start:end], bitmap_index.genders,
+                              bitmap_index.values['Sport'])
+
+
+@filter_callback(Output('Gender_Gap', 'figure'))
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_gender_gap(year, country, *filters):
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
-    fig_Gender_Year = go.Figure(data=data_bar, layout=layout_bar)
+    # -- Step 2 - Prepare Data to Plot
+    with metrics.stage('gap'):
+        df_Gap = gender_gap_trend(data, year, country, filters)
 
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                       Plot 3  - Gender Participation per Sport per Year
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+    # -- Step 3 - Plot the Figure
+    with metrics.stage('figure_build'):
+        return figures.gender_gap_figure(df_Gap)
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Comparison  - Countries Side by Side
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+@filter_callback([
+    Output('Country_Kpis', 'figure'),
+    Output('Country_Comparison', 'figure'),
+])
+@sessions.track
+@bundles.serve(filter_key)
+@result_cache.memoize(filter_key)
+@sessions.skip_superseded
+@compute_pool.offload
+def update_country_comparison(year, country, *filters):
+    # Every selected country in one query, whether 2 or 50 of them
+    if len(set(country or [])) < 2:
+        return figures.country_kpis_figure(None), figures.country_comparison_figure(None, None)
+
+    # -- Step 1 - Filter Data
+    data = snapshot
+    select(data, year, country, filters)
 
     # -- Step 2 - Prepare Data to Plot
+    with metrics.stage('comparison'):
+        df_Kpis, df_CountryYear = query(data, 'compare_countries', year, country, filters)
 
-    # - Step 2.1 - Women data
-    df_Plot_Woman = pd.pivot_table(df[df['Gender'] == "Women"], values='Medal', index=['Year'], columns=['Sport'],
-                                   aggfunc=len, dropna=False)
-    df_Plot_Woman[df_Plot_Woman > 0] = 2
-    df_Plot_Woman[np.isnan(df_Plot_Woman)] = 1
-    df_Plot_Men = pd.pivot_table(df[df['Gender'] == "Men"], values='Medal', index=['Year'], columns=['Sport'],
-                                 aggfunc=len)
-
-    # - Step 2.2 - Men data
-    df_Plot_Men[df_Plot_Men > 0] = 3
-    df_Plot_Men[np.isnan(df_Plot_Men)] = 1
-
-    # - Step 2.3 - Multipli Men and Women data
-    df_Sport_Year = df_Plot_Men * df_Plot_Woman
-
-    # - Step 2.4 - Check Missing Values
-    df_Sport_Year[np.isnan(df_Sport_Year)] = df_Plot_Men
-    df_Sport_Year[np.isnan(df_Sport_Year)] = df_Plot_Woman
-    df_Sport_Year[df_Sport_Year == 1] = 0
-
-    # - Step 2.5 - Set the scale
-    df_Sport_Year.replace(0, np.nan, inplace=True)
-    df_Sport_Year.replace(6, 1, inplace=True)
-    df_Sport_Year.replace(3, 0.5, inplace=True)
-    df_Sport_Year.replace(2, 0.25, inplace=True)
-    df_Plot = df_Sport_Year.T
-
-    # - Step 2.6 - Change data for the hover
-    df_Sport_Year_Name = df_Sport_Year.T
-    df_Sport_Year_Name.replace(np.nan, "None", inplace=True)
-    df_Sport_Year_Name.replace(1, "Both", inplace=True)
-    df_Sport_Year_Name.replace(0.5, "Men", inplace=True)
-    df_Sport_Year_Name.replace(0.25, "Women", inplace=True)
-
-    # Define the Values of the Heatmap
-    y_corr = df_Plot.index
-    x_corr = df_Plot.columns
-    z_corr = df_Plot
-    custom = df_Sport_Year_Name
-
-    data_corr = dict(type='heatmap',
-                     x=x_corr,
-                     y=y_corr,
-                     z=z_corr,
-                     customdata=custom,
-                     name='Gender Representation',
-                     colorscale=[[0, '#FFC0CB'], [0.33, '#FFC0CB'], [0.33, '#87CEFA'], [0.66, '#87CEFA'],
-                                 [0.66, '#c3e4a1'], [1, '#c3e4a1']],
-                     hovertemplate="Year: <b>%{x}</b><br>" +
-                                   "Sport: <b>%{y}</b><br>" +
-                                   "Played by: <b>%{customdata}</b><br>",
-                     colorbar=dict(tickmode="array", tickvals=[0.25, 0.5, 0.75], ticktext=["Women", "Men", "Both"])
-                     )
-
-    layout_corr = dict(title="Sports played per Gender",
-                       autosize=False,
-                       height=800,
-                       width=800,
-                       yaxis=dict(tickfont=dict(size=9)),
-                       xaxis=dict(tickfont=dict(size=9)),
-                       annotations=[
-                           dict(text='Softball was the only Sport played exclusively by Women since 1996 until 2014',
-                                x='1996',
-                                y='Softball',
-                                bordercolor="#FFC0CB",
-                                borderwidth=1,
-                                borderpad=4,
-                                bgcolor="#f9f9f9",
-                                opacity=0.8,
-                                ay=-10,
-                                ax=-200,
-                                font=dict(size=7)),
-                           dict(text='Women boxed in 2012, in London, for the first time.',
-                                x='2012',
-                                y='Boxing',
-                                bordercolor="#FFC0CB",
-                                borderwidth=1,
-                                borderpad=4,
-                                bgcolor="#f9f9f9",
-                                opacity=0.8,
-                                ay= -45,
-                                ax=-90,
-                                font=dict(size=7))
-                           ]
-                       )
+    # -- Step 3 - Plot the Figures
+    with metrics.stage('figure_build'):
+        return figures.country_kpis_figure(df_Kpis), figures.country_comparison_figure(df_Kpis, df_CountryYear)
 
-    # -- Step 3 - Plot the Figure
-    fig_Gender_Participation = go.Figure(data=data_corr, layout=layout_corr)
 
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
-    #                                                Plot 4  - Gender Swap
-    # |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        All the filter dependent outputs
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
 
-    # -- Step 2 - Prepare Data to Plot
-    df_GenderParticipationColumns = df_Sport_Year_Name.stack().reset_index().rename(
-        columns={'level_0': 'Sport', 'level_1': 'Year', 0: 'PlayedBy'})
-    df_GenderParticipationColumns.drop(columns=['Sport'])
-    df_GenderPlayedBy = pd.pivot_table(df_GenderParticipationColumns, index=['Year'], columns=['PlayedBy'], aggfunc=len)
-    df_GenderPlayedBy.columns = [col[1] for col in df_GenderPlayedBy.columns]
-    df_GenderPlayedBy = df_GenderPlayedBy.drop(columns=['None'], axis=1)
-    df_GenderPlayedBy.replace(np.nan, 0, inplace=True)
-
-    df_GenderPlayedBy['Total'] = df_GenderPlayedBy.sum(axis=1)
-    df_GenderPlayedBy['Men_Percentage'] = round(100 * df_GenderPlayedBy['Men'] / df_GenderPlayedBy['Total'], 2)
-    df_GenderPlayedBy['Women_Percentage'] = round(100 * df_GenderPlayedBy['Women'] / df_GenderPlayedBy['Total'], 2)
-    df_GenderPlayedBy['Both_Percentage'] = round(100 * df_GenderPlayedBy['Both'] / df_GenderPlayedBy['Total'], 2)
-
-    data_Men = (dict(type='bar',
-                     x=df_GenderPlayedBy.index,
-                     y=df_GenderPlayedBy['Men_Percentage'],
-                     text=df_GenderPlayedBy['Men_Percentage'],
-                     textposition='auto',
-                     name="Men",
-                     marker_color="#87CEFA",
-                     hovertemplate="Year: <b>%{x}</b><br>" +
-                                   "Gender: <b>Men</b><br>" +
-                                   "Percentage of Participation: <b>%{y}%</b><br>",
-                     )
-                )
-
-    data_Women = (dict(type='bar',
-                       x=df_GenderPlayedBy.index,
-                       y=df_GenderPlayedBy['Women_Percentage'],
-                       text=df_GenderPlayedBy['Women_Percentage'],
-                       textposition='auto',
-                       name="Women",
-                       marker_color="#FFC0CB",
-                       hovertemplate="Year: <b>%{x}</b><br>" +
-                                     "Gender: <b>Women</b><br>" +
-                                     "Percentage of Participation: <b>%{y}%</b><br>",
-                       )
-                  )
-
-    data_Both = (dict(type='bar',
-                      x=df_GenderPlayedBy.index,
-                      y=df_GenderPlayedBy['Both_Percentage'],
-                      text=df_GenderPlayedBy['Both_Percentage'],
-                      textposition='auto',
-                      name="Both",
-                      marker_color="#c3e4a1",
-                      hovertemplate="Year: <b>%{x}</b><br>" +
-                                    "Gender: <b>Both</b><br>" +
-                                    "Percentage of Participation: <b>%{y}%</b><br>",
-                      )
-                 )
-
-    data_bar = [data_Men, data_Women, data_Both]
-
-    layout_bar = dict(barmode='stack',
-                      title=dict(text='Percentage of Participation per Gender'),
-                      yaxis=dict(title='Percentage of Participation [%]'),
-                      xaxis=dict(title="Year"),
-                      )
+# In the order of the cards and charts of the page
+FILTER_CALLBACKS = [update_country_indicators, update_athletes_indicators, update_sports_indicators,
+                    update_gender_percentage, update_gender_year, update_gender_gap, update_country_comparison]
 
-    # -- Step 3 - Plot the Figure
-    fig_Gender_Swap = go.Figure(data=data_bar, layout=layout_bar)
 
-    return N_Country_Total_Filter, N_Country_Gender_Men_Filter, N_Country_Gender_Women_Filter, \
-           N_Athletes_Total_Filter, N_Athletes_Gender_Men_Filter, N_Athletes_Gender_Women_Filter, \
-           N_Sports_Total_Filter, N_Sports_Gender_Men_Filter, N_Sports_Gender_Women_Filter, \
-           fig_Gender_Percentage, fig_Gender_Year, fig_Gender_Participation, fig_Gender_Swap
+def update_graphs(year, country, *filters):
+    # Every output for one filter, used outside of Dash (benchmark, export)
+    outputs = ()
+    for callback in FILTER_CALLBACKS:
+        result = callback(year, country, *filters)
+        outputs += result if isinstance(result, tuple) else (result,)
+    return outputs
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Drill-down -----------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# A click on the heatmap selects a Sport in one Games (all countries, like the heatmap), a click on a bar selects
+# one gender in one Games within the filters of the page. The medal rows come from the intersection of the
+# posting lists of drill_index, not from a scan of df.
+
+DRILL_ROWS = 100
+
+
+@app.callback(Output('drill_selection', 'data'),
+              [Input('Gender_Participation', 'clickData'), Input('Gender_Year', 'clickData')],
+              [State('year_slider', 'value'), State('country_drop', 'value')] +
+              [State(filter_id(column), 'value') for column in EXTRA_FILTERS])
+def select_drill_down(heatmap_click, bar_click, year, country, *filters):
+    triggered = dash.callback_context.triggered[0]['prop_id'] if dash.callback_context.triggered else ''
+    if triggered.startswith('Gender_Participation') and heatmap_click:
+        point = heatmap_click['points'][0]
+        # The blank cells (code 0) are the sports without medals that year
+        return dict(year=int(point['x']), sport=point['y']) if point.get('z') else None
+    if triggered.startswith('Gender_Year') and bar_click:
+        point = bar_click['points'][0]
+        data = snapshot
+        # The bars are one trace per gender with medals inside the filters, in the order of gender_year_figure
+        genders = [gender for gender in ['Men', 'Women']
+                   if gender in query(data, 'medals_per_year', year, country, filters).columns]
+        return dict(year=int(point['x']), gender=genders[point['curveNumber']], country=sorted(country or []),
+                    filters=extra_filters(filters))
+    return None
+
+
+def drill_down(data, selection, search):
+    # (column and value found by the search, gender split, first DRILL_ROWS medals of the list, medals in the
+    # list) of a selection and a search, split None when there is nothing to show
+    if data_service.enabled:
+        return data_service.drill_down(selection, search, data.df.attrs['fingerprint'])
+    drill_index = data.drill_index
+    found = drill_index.search(search)
+    if (search or not selection) and found is None:
+        return None, None, None, 0
+
+    terms = {} if found is None else {found[0]: found[1]}
+    if 'sport' in selection:
+        terms['Sport'] = selection['sport']
+    year = (selection['year'], selection['year']) if 'year' in selection else None
+    filtered = None
+    if selection.get('filters'):
+        filtered = data.bitmap_index.row_numbers(data.bitmap_index.rows(year, selection.get('country'),
+                                                                        **selection['filters']))
+    rows = drill_index.lookup(year, selection.get('country'), rows=filtered, **terms)
+    # The split covers both genders, the list only the one of the clicked bar
+    shown = drill_index.of_gender(rows, selection.get('gender'))
+    return found, drill_index.gender_split(rows), drill_index.frame(shown, DRILL_ROWS), len(shown)
+
+
+def drill_down_panel(title, split, table, count):
+    header = html.Tr([html.Th(column.replace('_', ' ')) for column in table.columns])
+    body = [html.Tr([html.Td(str(value).replace('_', ' ') if isinstance(value, str) else value) for value in row])
+            for row in table.itertuples(index=False)]
+    shown = 'Showing the first {} of {} medals'.format(DRILL_ROWS, count) if count > DRILL_ROWS else \
+        '{} medals'.format(count)
+    return html.Div([
+        html.H4(title),
+        html.Div([
+            html.Span('Men: {}'.format(split.get('Men', 0)), style={'color': '#87CEFA', 'font-weight': 'bold'}),
+            html.Span(' | '),
+            html.Span('Women: {}'.format(split.get('Women', 0)), style={'color': '#FFC0CB', 'font-weight': 'bold'}),
+        ]),
+        html.Div(shown, style={'font-size': '0.8em', 'color': 'gray'}),
+        html.Table([html.Thead(header), html.Tbody(body)], style={'width': '100%', 'font-size': '0.8em'}),
+    ])
+
+
+@app.callback(Output('drill_panel', 'children'),
+              [Input('drill_selection', 'data'), Input('drill_search', 'value')])
+def update_drill_down(selection, search):
+    selection = selection or {}
+    with metrics.stage('drilldown'):
+        found, split, table, count = drill_down(snapshot, selection, search)
+    if search and found is None:
+        return html.Div('No athlete, event or discipline named "{}"'.format(search))
+    if split is None:
+        return None
+
+    title = []
+    if found is not None:
+        title.append(str(found[1]))
+    if 'sport' in selection:
+        title.append(selection['sport'])
+    if 'gender' in selection:
+        title.append(selection['gender'])
+    if selection.get('country'):
+        title.append(', '.join(country.replace('_', ' ') for country in selection['country']))
+    for values in selection.get('filters', {}).values():
+        title.append(', '.join(str(value) for value in values))
+    if 'year' in selection:
+        title.append(str(selection['year']))
+    return drill_down_panel(' - '.join(title), split, table, count)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,133 @@
+// Clientside callbacks of the OLYMPICS_CLIENTSIDE=1 mode.
+// The page carries the non-empty (Year, Country, Gender) cells of the cube in the compact_counts store
+// (see AggregateCube.compact_counts), the KPI cards and the donut are computed from it without calling the server.
+
+(function () {
+    var decoded = {source: null};
+
+    function typed(base64, Type) {
+        var binary = atob(base64);
+        var bytes = new Uint8Array(binary.length);
+        for (var i = 0; i < binary.length; i++) {
+            bytes[i] = binary.charCodeAt(i);
+        }
+        return new Type(bytes.buffer);
+    }
+
+    function cells(payload) {
+        // Typed arrays of the payload, decoded once per page
+        if (decoded.source !== payload) {
+            decoded = {
+                source: payload,
+                year: typed(payload.year, Uint16Array),
+                country: typed(payload.country, Uint16Array),
+                gender: typed(payload.gender, Uint8Array),
+                medals: typed(payload.medals, Uint32Array),
+                sports: typed(payload.sports, Uint8Array)
+            };
+        }
+        return decoded;
+    }
+
+    function selectedCells(payload, year, country) {
+        // Indexes of the cells inside the filter, same rules as AggregateCube.selection
+        var data = cells(payload);
+        var countries = null;
+        if (country && country.length) {
+            countries = {};
+            country.forEach(function (name) {
+                var index = payload.countries.indexOf(name);
+                if (index >= 0) {
+                    countries[index] = true;
+                }
+            });
+        }
+        var selected = [];
+        for (var i = 0; i < data.year.length; i++) {
+            var games = payload.years[data.year[i]];
+            if (games >= year[0] && games <= year[1] && (countries === null || countries[data.country[i]])) {
+                selected.push(i);
+            }
+        }
+        return selected;
+    }
+
+    function perGender(payload, split) {
+        // [total, Men, Women] like the server callbacks
+        var men = payload.genders.indexOf('Men');
+        var women = payload.genders.indexOf('Women');
+        return [split.total, men >= 0 ? split.genders[men] : 0, women >= 0 ? split.genders[women] : 0];
+    }
+
+    function popcount(bytes) {
+        var count = 0;
+        for (var i = 0; i < bytes.length; i++) {
+            for (var byte = bytes[i]; byte; byte &= byte - 1) {
+                count++;
+            }
+        }
+        return count;
+    }
+
+    window.dash_clientside = Object.assign({}, window.dash_clientside, {
+        olympics: {
+            countryIndicators: function (year, country, payload) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var data = cells(payload);
+                var all = {}, genders = payload.genders.map(function () { return {}; });
+                selectedCells(payload, year, country).forEach(function (i) {
+                    all[data.country[i]] = true;
+                    genders[data.gender[i]][data.country[i]] = true;
+                });
+                return perGender(payload, {
+                    total: Object.keys(all).length,
+                    genders: genders.map(function (set) { return Object.keys(set).length; })
+                });
+            },
+
+            sportsIndicators: function (year, country, payload) {
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var data = cells(payload);
+                var width = payload.sport_bytes;
+                var all = new Uint8Array(width);
+                var genders = payload.genders.map(function () { return new Uint8Array(width); });
+                selectedCells(payload, year, country).forEach(function (i) {
+                    for (var b = 0; b < width; b++) {
+                        genders[data.gender[i]][b] |= data.sports[i * width + b];
+                        all[b] |= data.sports[i * width + b];
+                    }
+                });
+                return perGender(payload, {total: popcount(all), genders: genders.map(popcount)});
+            },
+
+            genderPercentage: function (year, country, payload) {
+                // Same figure as figures.gender_percentage_figure
+                if (!payload) {
+                    return window.dash_clientside.no_update;
+                }
+                var data = cells(payload);
+                var medals = payload.genders.map(function () { return 0; });
+                selectedCells(payload, year, country).forEach(function (i) {
+                    medals[data.gender[i]] += data.medals[i];
+                });
+                var counts = payload.genders
+                    .map(function (gender, g) { return {gender: gender, medals: medals[g]}; })
+                    .filter(function (item) { return item.medals > 0; })
+                    .sort(function (a, b) { return b.medals - a.medals; });
+                var donut = payload.donut;
+                var trace = {
+                    type: 'pie',
+                    labels: counts.map(function (item) { return item.gender; }),
+                    values: counts.map(function (item) { return item.medals; }),
+                    marker: {colors: donut.colors},
+                    hole: donut.hole
+                };
+                return {data: [trace], layout: counts.length ? donut.layout : donut.layout_no_data};
+            }
+        }
+    });
+})();
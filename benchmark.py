@@ -0,0 +1,287 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import argparse
+import contextlib
+import json
+import random
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import app
+import figures
+from bitmaps import BitmapIndex
+from cube import AggregateCube
+from trends import GenderGap
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Benchmark ------------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Latency of the filter callbacks (update_graphs, without the result cache) over a workload of filters like the
+# ones users send, on the real dataset and on synthetic datasets with 10x, 100x, ... the rows.
+#
+#   python benchmark.py --scales 1,10,100 --repeat 3 --json bench.json
+
+STAGES = ['filter', 'kpi_countries', 'kpi_athletes', 'kpi_sports', 'donut', 'bar', 'gap', 'figure_build']
+
+# Countries compared at once: the comparison should cost about the same for 2 and for 50 of them
+COMPARED = [2, 5, 10, 20, 50]
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Workload
+# ___________________________________________________________________________________________________________________#
+
+def make_workload(df, years, seed=0, size=20):
+    # (name, year range, countries, other filters) of the typical filters of the app
+    rng = random.Random(seed)
+    years = [int(y) for y in years]
+    countries = sorted(df['Country_Name'].unique().tolist())
+    full = [years[0], years[-1]]
+
+    def some_range():
+        start = rng.randrange(len(years))
+        end = min(len(years) - 1, start + rng.randrange(1, 6))
+        return [years[start], years[end]]
+
+    workload = [('all_years_no_country', full, [], {})]
+    workload += [('single_games', [y, y], [], {}) for y in rng.sample(years, min(size, len(years)))]
+    workload += [('narrow_range', some_range(), [], {}) for _ in range(size)]
+    for n in [1, 5, 50]:
+        workload += [('{}_countries'.format(n), full, rng.sample(countries, min(n, len(countries))), {})
+                     for _ in range(size // 2)]
+        workload += [('{}_countries_narrow'.format(n), some_range(), rng.sample(countries, min(n, len(countries))),
+                      {}) for _ in range(size // 2)]
+
+    # 1 to 4 of the Season, Sport, Discipline and Medal filters: the latency should not grow with their number
+    for n in range(1, len(app.EXTRA_FILTERS) + 1):
+        for _ in range(size // 2):
+            filters = {column: rng.sample(sorted(df[column].unique().tolist()), 1)
+                       for column in app.EXTRA_FILTERS[:n]}
+            workload.append(('{}_other_filters'.format(n), full, rng.sample(countries, rng.choice([0, 5])), filters))
+
+    # Filters with empty outputs: countries without any woman medalist, Games before a country's first medal
+    women = df[df['Gender'] == 'Women']['Country_Name'].unique().tolist()
+    no_women = [c for c in countries if c not in set(women)]
+    workload += [('no_women_medalists', full, [c], {})
+                 for c in rng.sample(no_women, min(size // 2, len(no_women)))]
+    first_games = df.groupby('Country_Name', observed=True)['Year'].min()
+    late = first_games[first_games > years[0]]
+    for country in rng.sample(late.index.tolist(), min(size // 2, len(late))):
+        workload.append(('no_medals', [years[0], int(late[country]) - 1], [country], {}))
+    return workload
+
+
+def compared_countries(df, seed=0):
+    # The countries of the comparison benchmark, the first n of them for n countries
+    countries = sorted(df['Country_Name'].unique().tolist())
+    return random.Random(seed).sample(countries, min(max(COMPARED), len(countries)))
+
+
+def scale_dataset(df, factor):
+    # factor copies of the medal rows, with distinct athletes in every copy so the distinct counts scale too
+    if factor == 1:
+        return df
+    copies = []
+    for i in range(factor):
+        copy = df.copy()
+        copy['Athlete'] = copy['Athlete'].astype(str) + '#{}'.format(i)
+        copies.append(copy)
+    return pd.concat(copies, ignore_index=True)
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Measures
+# ___________________________________________________________________________________________________________________#
+
+def percentiles(samples):
+    samples = np.asarray(samples) * 1000
+    return dict(p50=round(float(np.percentile(samples, 50)), 3),
+                p95=round(float(np.percentile(samples, 95)), 3),
+                p99=round(float(np.percentile(samples, 99)), 3),
+                mean=round(float(samples.mean()), 3))
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+def run_stages(cube, bitmap_index, year, country, filters):
+    # The steps of update_graphs, one by one, on the cube or on the bitmap index like app.query
+    times = {}
+    if filters:
+        bitmap_index.selections.clear()
+        times['filter'], selected = timed(bitmap_index.rows, year, country, **filters)
+        source, args = bitmap_index, (selected,)
+    else:
+        cube.selections.clear()
+        times['filter'], _ = timed(cube.selection, year, country)
+        source, args = cube, (year, country)
+    times['kpi_countries'], _ = timed(source.countries_per_gender, *args)
+    times['kpi_athletes'], _ = timed(source.athletes_per_gender, *args)
+    times['kpi_sports'], _ = timed(source.sports_per_gender, *args)
+    times['donut'], medals = timed(source.medals_per_gender, *args)
+    times['bar'], per_year = timed(source.medals_per_year, *args)
+    times['gap'], gap = timed(app.gender_gap_trend, app.snapshot, year, country,
+                              [filters.get(column) for column in app.EXTRA_FILTERS])
+    start = time.perf_counter()
+    figures.gender_percentage_figure(medals)
+    figures.gender_year_figure(per_year)
+    figures.gender_gap_figure(gap)
+    times['figure_build'] = time.perf_counter() - start
+    return times
+
+
+def run_comparison(countries, year, repeat):
+    # update_country_comparison (one grouped pass, on the cube or with a Season filter on the bitmap index)
+    # against the KPIs and the bar chart queried once per country
+    no_filters = [None] * len(app.EXTRA_FILTERS)
+    summer = [['Summer']] + [None] * (len(app.EXTRA_FILTERS) - 1)
+    one_by_one = [app.update_country_indicators, app.update_athletes_indicators, app.update_sports_indicators,
+                  app.update_gender_year]
+    results = {}
+    for n in COMPARED:
+        selected = countries[:n]
+        samples = dict(grouped=[], grouped_filtered=[], per_country=[])
+        for _ in range(repeat * 5):
+            app.snapshot.cube.selections.clear()
+            app.snapshot.bitmap_index.selections.clear()
+            samples['grouped'].append(timed(app.update_country_comparison, year, selected, *no_filters)[0])
+            samples['grouped_filtered'].append(timed(app.update_country_comparison, year, selected, *summer)[0])
+            start = time.perf_counter()
+            for country in selected:
+                for callback in one_by_one:
+                    callback(year, [country], *no_filters)
+            samples['per_country'].append(time.perf_counter() - start)
+        results[n] = {name: percentiles(values) for name, values in samples.items()}
+    return results
+
+
+@contextlib.contextmanager
+def serving(data):
+    # update_graphs reads the cube, bitmap index and prefix sums of the snapshot of the app, without the cache
+    app_snapshot, app.snapshot = app.snapshot, data
+    app.result_cache.enabled = False
+    try:
+        yield
+    finally:
+        app.snapshot = app_snapshot
+        app.result_cache.enabled = True
+
+
+def build(scaled):
+    # Snapshot of the scaled data, with the build time of each structure
+    times = {}
+    times['cube'], cube = timed(AggregateCube, scaled)
+    times['bitmaps'], bitmap_index = timed(BitmapIndex, scaled)
+    times['gender_gap'], gender_gap = timed(GenderGap, cube)
+    times['heatmap'], static_figures = timed(figures.build_static_figures, cube)
+    return times, app.snapshot._replace(df=scaled, cube=cube, static_figures=static_figures,
+                                        bitmap_index=bitmap_index, gender_gap=gender_gap)
+
+
+def measure_memory(scaled, workload):
+    # Peak memory of the builds, then of one pass over the workload. A pass of its own: tracemalloc slows down
+    # every allocation, the timings are taken without it.
+    tracemalloc.start()
+    try:
+        _, data = build(scaled)
+        _, startup_peak = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        with serving(data):
+            for _, year, country, filters in workload:
+                app.update_graphs(year, country, *[filters.get(column) for column in app.EXTRA_FILTERS])
+        _, callback_peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return startup_peak, callback_peak
+
+
+def run_scale(df, factor, workload, repeat, countries):
+    scaled = scale_dataset(df, factor)
+    build_times, data = build(scaled)
+    cube, bitmap_index = data.cube, data.bitmap_index
+
+    totals, stages, names = [], {stage: [] for stage in STAGES}, {}
+    with serving(data):
+        for _ in range(repeat):
+            for name, year, country, filters in workload:
+                cube.selections.clear()
+                bitmap_index.selections.clear()
+                elapsed, _ = timed(app.update_graphs, year, country,
+                                   *[filters.get(column) for column in app.EXTRA_FILTERS])
+                totals.append(elapsed)
+                names.setdefault(name, []).append(elapsed)
+                for stage, elapsed in run_stages(cube, bitmap_index, year, country, filters).items():
+                    stages[stage].append(elapsed)
+        comparison = run_comparison(countries, [int(cube.years[0]), int(cube.years[-1])], repeat)
+
+    startup_peak, callback_peak = measure_memory(scaled, workload)
+
+    return dict(scale=factor,
+                rows=len(scaled),
+                cube_build_ms=round(build_times['cube'] * 1000, 3),
+                bitmaps_build_ms=round(build_times['bitmaps'] * 1000, 3),
+                gender_gap_build_ms=round(build_times['gender_gap'] * 1000, 3),
+                heatmap_ms=round(build_times['heatmap'] * 1000, 3),
+                startup_peak_mb=round(startup_peak / 1e6, 2),
+                callback_peak_mb=round(callback_peak / 1e6, 2),
+                update_graphs=percentiles(totals),
+                stages={stage: percentiles(samples) for stage, samples in stages.items()},
+                workloads={name: percentiles(samples) for name, samples in names.items()},
+                comparison=comparison)
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Report
+# ___________________________________________________________________________________________________________________#
+
+def print_report(result):
+    print('')
+    print('Scale x{scale} - {rows} rows - cube build {cube_build_ms} ms - bitmaps build {bitmaps_build_ms} ms - '
+          'gender gap build {gender_gap_build_ms} ms - heatmap {heatmap_ms} ms - '
+          'peak memory startup {startup_peak_mb} MB / callbacks {callback_peak_mb} MB'.format(**result))
+    print('{:<28}{:>10}{:>10}{:>10}{:>10}'.format('[ms]', 'p50', 'p95', 'p99', 'mean'))
+    rows = [('update_graphs', result['update_graphs'])]
+    rows += [('  ' + stage, values) for stage, values in result['stages'].items()]
+    rows += [('  ' + name, values) for name, values in result['workloads'].items()]
+    for name, values in rows:
+        print('{:<28}{p50:>10}{p95:>10}{p99:>10}{mean:>10}'.format(name, **values))
+    print('{:<28}{:>10}{:>18}{:>14}'.format('[ms p50] countries compared', 'grouped', 'grouped + Season', 'per country'))
+    for n, values in result['comparison'].items():
+        print('{:<28}{:>10}{:>18}{:>14}'.format(n, values['grouped']['p50'], values['grouped_filtered']['p50'],
+                                                values['per_country']['p50']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency of update_graphs over a workload of filters')
+    parser.add_argument('--scales', default='1,10', help='comma separated row multipliers, e.g. 1,10,100')
+    parser.add_argument('--repeat', type=int, default=3, help='passes over the workload')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+    app.warm_up()
+
+    data = app.snapshot
+    workload = make_workload(data.df, data.cube.years, seed=args.seed)
+    countries = compared_countries(data.df, seed=args.seed)
+    results = []
+    for factor in [int(scale) for scale in args.scales.split(',')]:
+        result = run_scale(data.df, factor, workload, args.repeat, countries)
+        print_report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import numpy as np
+import pandas as pd
+
+from cube import POPCOUNT, codes_of, comparison_tables
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Bitmap Index ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# One bitmap of the medal rows per value of Year, Country_Name, Gender, Season, Sport, Discipline and Medal, packed
+# 8 rows per byte (4.6 KB per value for the 37k rows). A filter is the OR of the bitmaps of its values, a
+# combination of filters the AND of the filters, so every filter added costs a few KB of bitwise operations instead
+# of a scan of a column. The cards and the charts are then counted on the bitmap of the selected rows:
+# popcounts of its AND with the Gender / Year / Country / Sport bitmaps, and the athletes of its rows.
+#
+# The cube answers the Year x Country filters faster still, the bitmaps serve the combinations it can't.
+
+BITMAP_COLUMNS = ['Year', 'Country_Name', 'Gender', 'Season', 'Sport', 'Discipline', 'Medal']
+
+
+def popcount(bitmaps):
+    # Rows of each bitmap (last axis), with the popcount instruction of numpy >= 2.0 when there is one
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(bitmaps).sum(axis=-1, dtype=np.int64)
+    return POPCOUNT[bitmaps].sum(axis=-1)
+
+
+class BitmapIndex:
+
+    def __init__(self, df, distinct_columns=('Athlete',)):
+        self.n_rows = len(df)
+        self.n_bytes = (self.n_rows + 7) // 8
+        self.values, self.value_index, self.bitmaps, self.codes = {}, {}, {}, {}
+        rows = np.arange(self.n_rows)
+        for column in BITMAP_COLUMNS:
+            codes, values = codes_of(df[column])
+            if column == 'Year':
+                values = [int(value) for value in values]
+            present = np.zeros((len(values), self.n_rows), dtype=bool)
+            present[codes[codes >= 0], rows[codes >= 0]] = True
+            self.values[column] = values
+            self.value_index[column] = {value: code for code, value in enumerate(values)}
+            self.bitmaps[column] = np.packbits(present, axis=1)
+            self.codes[column] = codes
+        self.genders = self.values['Gender']
+        self.gender_codes = codes_of(df['Gender'])[0]
+        # Distinct columns are counted from the codes of the selected rows
+        self.distinct = {column: codes_of(df[column]) for column in distinct_columns}
+        self.selections = {}
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Filters -> Rows
+    # ___________________________________________________________________________________________________________________#
+
+    def any_of(self, column, values):
+        # OR of the bitmaps of the values, unknown values are ignored like in isin
+        codes = [self.value_index[column][value] for value in values if value in self.value_index[column]]
+        if not codes:
+            return np.zeros(self.n_bytes, dtype=np.uint8)
+        return np.bitwise_or.reduce(self.bitmaps[column][codes], axis=0)
+
+    def rows(self, year, country=None, **filters):
+        # Bitmap of the rows inside the (start, end) Games range, the countries and every other filter,
+        # e.g. rows((1896, 2014), ['France'], Season=['Winter'], Medal=['Gold']). An empty filter selects everything.
+        key = (tuple(year), tuple(country or ())) + tuple((column, tuple(values or ()))
+                                                          for column, values in sorted(filters.items()))
+        selected = self.selections.get(key)
+        if selected is None:
+            selected = self.any_of('Year', [value for value in self.values['Year'] if year[0] <= value <= year[1]])
+            for column, values in [('Country_Name', country)] + sorted(filters.items()):
+                if values:
+                    selected &= self.any_of(column, values)
+            if len(self.selections) >= 1024:
+                self.selections.clear()
+            self.selections[key] = selected
+        return selected
+
+    def row_numbers(self, selected):
+        return np.flatnonzero(np.unpackbits(selected, count=self.n_rows))
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Queries
+    # ___________________________________________________________________________________________________________________#
+
+    # Same answers as the queries of AggregateCube, from the bitmap of the selected rows
+
+    def values_per_gender(self, column, selected):
+        # Values of a column with rows in the selection, in total and per gender
+        present = self.bitmaps[column] & selected
+        per_gender = {gender: int((present & self.bitmaps['Gender'][g]).any(axis=1).sum())
+                      for g, gender in enumerate(self.genders)}
+        return int(present.any(axis=1).sum()), per_gender
+
+    def countries_per_gender(self, selected):
+        return self.values_per_gender('Country_Name', selected)
+
+    def sports_per_gender(self, selected):
+        return self.values_per_gender('Sport', selected)
+
+    def distinct_per_gender(self, column, selected):
+        codes, entities = self.distinct[column]
+        rows = self.row_numbers(selected)
+        present = np.zeros((len(entities), len(self.genders)), dtype=bool)
+        present[codes[rows], self.gender_codes[rows]] = True
+        return int(present.any(axis=1).sum()), {gender: int(present[:, g].sum())
+                                                for g, gender in enumerate(self.genders)}
+
+    def athletes_per_gender(self, selected):
+        return self.distinct_per_gender('Athlete', selected)
+
+    def medals_per_gender(self, selected):
+        counts = popcount(self.bitmaps['Gender'] & selected)
+        return {gender: int(counts[g]) for g, gender in enumerate(self.genders)}
+
+    def medals_per_year(self, selected):
+        # DataFrame Year x Gender, only the Games and genders with medals, NaN where a gender has none
+        years = self.bitmaps['Year'] & selected
+        counts = np.stack([popcount(years & gender) for gender in self.bitmaps['Gender']], axis=1)
+        table = pd.DataFrame(counts, index=pd.Index(self.values['Year'], name='Year'),
+                             columns=pd.Index(self.genders, name='Gender'), dtype=float)
+        table = table[table.sum(axis=1) > 0]
+        table = table.loc[:, table.sum(axis=0) > 0]
+        return table.replace(0, np.nan)
+
+    def medals_per_games_sport(self, selected, columns=('Year', 'Gender', 'Sport')):
+        # Year x Gender x Sport medal counts of the selection (trends.trend_table takes their prefix sums)
+        rows = self.row_numbers(selected)
+        codes = [self.codes[column][rows] for column in columns]
+        known = np.logical_and.reduce([code >= 0 for code in codes])
+        shape = tuple(len(self.values[column]) for column in columns)
+        flat = np.ravel_multi_index([code[known] for code in codes], shape)
+        return np.bincount(flat, minlength=int(np.prod(shape))).reshape(shape)
+
+    def compare_countries(self, selected):
+        # Same answer as AggregateCube.compare_countries: the codes of the selected rows grouped by
+        # (country, year, gender) for the medals, and the distinct (country, gender, sport / athlete) for the others
+        rows = self.row_numbers(selected)
+        rows = rows[self.codes['Country_Name'][rows] >= 0]
+        country_codes = self.codes['Country_Name'][rows]
+        countries = np.unique(country_codes)
+        position = np.searchsorted(countries, country_codes)
+        gender = self.gender_codes[rows]
+        n_countries, n_years, n_genders = len(countries), len(self.values['Year']), len(self.genders)
+
+        flat = (position * n_years + self.codes['Year'][rows]) * n_genders + gender
+        per_year = np.bincount(flat, minlength=n_countries * n_years * n_genders).reshape(
+            n_countries, n_years, n_genders)
+
+        def distinct(codes, n_values):
+            # Country x Gender number of distinct codes
+            pairs = np.unique((position * n_genders + gender) * n_values + codes)
+            return np.bincount(pairs // n_values, minlength=n_countries * n_genders).reshape(n_countries, n_genders)
+
+        athlete_codes, athletes = self.distinct['Athlete']
+        return comparison_tables([self.values['Country_Name'][c] for c in countries], self.values['Year'],
+                                 self.genders, per_year,
+                                 distinct(athlete_codes[rows], len(athletes)),
+                                 distinct(self.codes['Sport'][rows], len(self.values['Sport'])))
@@ -0,0 +1,121 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import functools
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Exported Bundles -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Answers of the filter callbacks computed ahead of time by export.py, one gzipped JSON file per set of countries:
+#
+#   {"countries": [...], "results": {"1896-2014": {"update_country_indicators": [145, 140, 94], ...}, ...}}
+#
+# The manifest records the data the bundles were computed from, bundles of another dataset (or of the dataset
+# before a new edition was appended) are never served.
+
+MANIFEST = 'manifest.json'
+BUNDLE_VERSION = 1
+
+
+def set_name(countries):
+    # File name of the bundle of a set of countries, '_all' for the empty dropdown
+    if not countries:
+        return '_all'
+    return hashlib.sha1('|'.join(sorted(countries)).encode('utf-8')).hexdigest()[:16]
+
+
+def games_key(games):
+    # (first, last) Games of a filter -> "first-last", '' when the range holds no Games
+    return '{}-{}'.format(*games) if games else ''
+
+
+def write_bundle(directory, countries, results):
+    path = os.path.join(directory, set_name(countries) + '.json.gz')
+    with gzip.open(path, 'wt', encoding='utf-8', compresslevel=6) as handle:
+        json.dump(dict(countries=list(countries), results=results), handle, separators=(',', ':'))
+    return path
+
+
+class Bundles:
+
+    def __init__(self, directory=None, source=None, max_files=64):
+        # source: fingerprint of the data being served, compared to the one of the manifest
+        self.directory = directory
+        self.source = source
+        self.max_files = max_files
+        self.manifest = None
+        if directory:
+            try:
+                with open(os.path.join(directory, MANIFEST)) as handle:
+                    self.manifest = json.load(handle)
+            except (OSError, ValueError):
+                self.manifest = None
+        self.files = OrderedDict()
+        self.lock = threading.Lock()
+        self.counters = dict(hits=0, misses=0)
+
+    @property
+    def enabled(self):
+        return self.manifest is not None and self.manifest.get('version') == BUNDLE_VERSION and \
+            self.manifest.get('source') == self.source
+
+    def load(self, name):
+        # Results of one bundle file, the most recently used ones are kept decompressed
+        with self.lock:
+            if name in self.files:
+                self.files.move_to_end(name)
+                return self.files[name]
+        try:
+            with gzip.open(os.path.join(self.directory, name + '.json.gz'), 'rt', encoding='utf-8') as handle:
+                results = json.load(handle)['results']
+        except (OSError, ValueError, KeyError):
+            results = {}
+        with self.lock:
+            self.files[name] = results
+            while len(self.files) > self.max_files:
+                self.files.popitem(last=False)
+        return results
+
+    def get(self, function_name, key):
+        games, countries, extra = key
+        if extra:
+            # Only the year and country filters are exported
+            return False, None
+        found = self.load(set_name(countries)).get(games_key(games), {})
+        with self.lock:
+            self.counters['hits' if function_name in found else 'misses'] += 1
+        value = found.get(function_name)
+        # The indicator callbacks return tuples, JSON gave lists back
+        return function_name in found, tuple(value) if isinstance(value, list) else value
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, enabled=int(self.enabled), files=len(self.files))
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Decorator
+    # ___________________________________________________________________________________________________________________#
+
+    def serve(self, make_key):
+        # Answers from the bundles, the function is only called for the filters that were not exported
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args):
+                if self.enabled:
+                    found, value = self.get(function.__name__, make_key(*args))
+                    if found:
+                        return value
+                return function(*args)
+
+            wrapper.bundles = self
+            return wrapper
+
+        return decorator
@@ -0,0 +1,263 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import functools
+import hashlib
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Result Cache ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+
+class ResultCache:
+    # LRU cache of callback results, bounded both in number of entries and in bytes.
+    # Results are kept pickled: the size of an entry is exact and a cached figure can't be
+    # modified by the caller that received it. With a cache_dir the entries are also written
+    # to disk, so every gunicorn worker pointing at the same folder shares them: one folder per namespace,
+    # bounded to max_disk_bytes (the least recently used files go first), and the folders of the other
+    # namespaces are removed when the namespace changes.
+
+    def __init__(self, max_entries=256, max_bytes=64 * 1024 * 1024, cache_dir=None, namespace='',
+                 max_disk_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.cache_dir = cache_dir
+        self.namespace = namespace
+        self.max_disk_bytes = max_disk_bytes
+        # Bytes written to disk by this process since its last check of the folder size
+        self.disk_written = 0
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+        self.counters = dict(hits=0, disk_hits=0, misses=0, evictions=0, disk_evictions=0, shared=0)
+        # key -> Flight of the computations running now, see memoize
+        self.flights = {}
+        # When disabled, memoized functions are always computed (used by the benchmark)
+        self.enabled = True
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Memory
+    # ___________________________________________________________________________________________________________________#
+
+    def get(self, key):
+        with self.lock:
+            blob = self.entries.get(key)
+            if blob is not None:
+                self.entries.move_to_end(key)
+                self.counters['hits'] += 1
+                return True, pickle.loads(blob)
+
+        blob = self.read_disk(key)
+        if blob is not None:
+            self.store(key, blob)
+            with self.lock:
+                self.counters['disk_hits'] += 1
+            return True, pickle.loads(blob)
+
+        with self.lock:
+            self.counters['misses'] += 1
+        return False, None
+
+    def put(self, key, value):
+        blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        self.store(key, blob)
+        self.write_disk(key, blob)
+        return blob
+
+    def store(self, key, blob):
+        if len(blob) > self.max_bytes:
+            return
+        with self.lock:
+            old = self.entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self.entries[key] = blob
+            self.size += len(blob)
+            while len(self.entries) > self.max_entries or self.size > self.max_bytes:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= len(evicted)
+                self.counters['evictions'] += 1
+
+    def invalidate(self, predicate=None):
+        # Drop every entry (or the ones whose key matches the predicate), memory and disk
+        with self.lock:
+            keys = [key for key in self.entries if predicate is None or predicate(key)]
+            for key in keys:
+                self.size -= len(self.entries.pop(key))
+        if self.cache_dir and predicate is None:
+            self.remove_namespaces()
+        else:
+            for key in keys:
+                try:
+                    os.remove(self.disk_path(key))
+                except (OSError, TypeError):
+                    pass
+        return len(keys)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.counters, entries=len(self.entries), bytes=self.size)
+        lookups = stats['hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_ratio'] = round((stats['hits'] + stats['disk_hits']) / lookups, 4) if lookups else 0.0
+        return stats
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Disk
+    # ___________________________________________________________________________________________________________________#
+
+    def namespace_dir(self):
+        digest = hashlib.sha1(repr(self.namespace).encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, digest[:16])
+
+    def use_namespace(self, namespace):
+        # Entries of another namespace (other data) are never read again, their folders are removed
+        self.namespace = namespace
+        if self.cache_dir:
+            self.remove_namespaces(keep=os.path.basename(self.namespace_dir()))
+
+    def remove_namespaces(self, keep=None):
+        try:
+            names = os.listdir(self.cache_dir)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.cache_dir, name)
+            if name != keep and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    def disk_path(self, key):
+        if not self.cache_dir:
+            return None
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.namespace_dir(), digest + '.pkl')
+
+    def read_disk(self, key):
+        path = self.disk_path(key)
+        if path is None:
+            return None
+        try:
+            with open(path, 'rb') as handle:
+                blob = handle.read()
+        except OSError:
+            return None
+        # Recently used: the trimming of the folder removes the oldest modification times first
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return blob
+
+    def write_disk(self, key, blob):
+        path = self.disk_path(key)
+        if path is None:
+            return
+        # Written next to the final file and renamed, so other workers never read a partial entry
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            with os.fdopen(handle, 'wb') as tmp:
+                tmp.write(blob)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        # The folder is listed once every 1/16 of the bound written by this process, not on every write
+        with self.lock:
+            self.disk_written += len(blob)
+            check = self.disk_written >= self.max_disk_bytes // 16
+            if check:
+                self.disk_written = 0
+        if check:
+            self.trim_disk()
+
+    def trim_disk(self):
+        # Over max_disk_bytes, the least recently used entries of the namespace are removed down to 3/4 of it
+        files = []
+        try:
+            with os.scandir(self.namespace_dir()) as entries:
+                for entry in entries:
+                    try:
+                        if entry.name.endswith('.pkl'):
+                            stat = entry.stat()
+                            files.append((stat.st_mtime, stat.st_size, entry.path))
+                    except OSError:
+                        pass
+        except OSError:
+            return
+        total = sum(size for _, size, _ in files)
+        if total <= self.max_disk_bytes:
+            return
+        removed = 0
+        for _, size, path in sorted(files):
+            if total <= self.max_disk_bytes * 3 // 4:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self.lock:
+            self.counters['disk_evictions'] += removed
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Decorator
+    # ___________________________________________________________________________________________________________________#
+
+    def memoize(self, make_key, wait=30.0):
+        # make_key receives the arguments of the function and returns its canonical, hashable key,
+        # the name of the function is added to it so several functions can share the same cache.
+        # Single-flight: a call arriving while the same key is being computed waits for that result (at most
+        # `wait` seconds) instead of computing it again.
+        def decorator(function):
+            @functools.wraps(function)
+            def wrapper(*args):
+                if not self.enabled:
+                    return function(*args)
+                key = (function.__name__, make_key(*args))
+                found, value = self.get(key)
+                if found:
+                    return value
+
+                with self.lock:
+                    flight = self.flights.get(key)
+                    leader = flight is None
+                    if leader:
+                        flight = self.flights[key] = Flight()
+                if not leader:
+                    if flight.done.wait(wait) and flight.blob is not None:
+                        with self.lock:
+                            self.counters['shared'] += 1
+                        return pickle.loads(flight.blob)
+                    # The first call failed, was dropped or is too slow: compute it here
+                    return function(*args)
+
+                try:
+                    value = function(*args)
+                    flight.blob = self.put(key, value)
+                    return value
+                finally:
+                    with self.lock:
+                        del self.flights[key]
+                    flight.done.set()
+
+            wrapper.cache = self
+            return wrapper
+
+        return decorator
+
+
+class Flight:
+    # One computation in progress, the calls waiting for it get a copy of its pickled result
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.blob = None
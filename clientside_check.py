@@ -0,0 +1,108 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+
+from plotly.utils import PlotlyJSONEncoder
+
+import app
+import figures
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Clientside Parity ----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# The OLYMPICS_CLIENTSIDE=1 mode computes the country and sports cards and the donut in the browser, from the
+# compact_counts store. This runs assets/clientside.js with node on a set of fixed filters and checks that
+# countryIndicators, sportsIndicators and genderPercentage answer exactly like the server callbacks.
+#
+#   python clientside_check.py --cases 200
+#
+# Exits with 1 and lists the filters that differ, if any.
+
+CLIENTSIDE_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'clientside.js')
+
+# function of assets/clientside.js -> server callback it stands for
+PAIRS = [('countryIndicators', 'update_country_indicators'),
+         ('sportsIndicators', 'update_sports_indicators'),
+         ('genderPercentage', 'update_gender_percentage')]
+
+# Loads assets/clientside.js as the browser would (window.dash_clientside) and answers every case read on stdin
+NODE_SCRIPT = '''
+globalThis.window = globalThis;
+require(process.argv[1]);
+var input = JSON.parse(require('fs').readFileSync(0, 'utf8'));
+var functions = window.dash_clientside.olympics;
+var answers = input.cases.map(function (item) {
+    var answer = {};
+    input.functions.forEach(function (name) {
+        answer[name] = functions[name](item.year, item.country, input.payload);
+    });
+    return answer;
+});
+process.stdout.write(JSON.stringify(answers));
+'''
+
+
+def make_cases(data, seed=0, size=200):
+    # (year range, countries) the slider and the dropdown can send, + the edge cases
+    rng = random.Random(seed)
+    years = [int(year) for year in data.cube.years]
+    countries = sorted(data.cube.countries)
+    cases = [([years[0], years[-1]], []), ([years[0], years[0]], []), ([years[-1], years[-1]], []),
+             ([years[0], years[-1]], ['No_Such_Country'])]
+    for _ in range(size):
+        start, end = sorted(rng.sample(years, 2))
+        cases.append(([start, end], rng.sample(countries, rng.choice([0, 1, 2, 5, 20]))))
+    return [dict(year=year, country=country) for year, country in cases]
+
+
+def clientside_answers(payload, cases):
+    process = subprocess.run(['node', '-e', NODE_SCRIPT, CLIENTSIDE_JS], check=True, capture_output=True,
+                             input=json.dumps(dict(payload=payload, cases=cases,
+                                                   functions=[name for name, _ in PAIRS])).encode())
+    return json.loads(process.stdout)
+
+
+def as_json(value):
+    # Tuples, numpy numbers and plotly objects as the browser gets them
+    return json.loads(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Check assets/clientside.js against the server callbacks')
+    parser.add_argument('--cases', type=int, default=200, help='random filters besides the edge cases')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    app.warm_up()
+    data = app.snapshot
+
+    # The server callbacks compute every answer
+    app.result_cache.enabled = False
+    app.bundles.manifest = None
+
+    cases = make_cases(data, seed=args.seed, size=args.cases)
+    payload = as_json(dict(data.cube.compact_counts(), donut=figures.DONUT_CLIENTSIDE))
+    different = 0
+    for case, answer in zip(cases, clientside_answers(payload, cases)):
+        for clientside, callback in PAIRS:
+            expected = as_json(getattr(app, callback)(case['year'], case['country'],
+                                                      *[None] * len(app.EXTRA_FILTERS)))
+            if answer[clientside] != expected:
+                different += 1
+                # Of a figure, the traces: the layouts come from the same DONUT_CLIENTSIDE
+                shown = [value['data'] if isinstance(value, dict) else value
+                         for value in (answer[clientside], expected)]
+                print('{} {} {}: clientside {} server {}'.format(clientside, case['year'], case['country'], *shown))
+    print('{} filters x {} functions, {} different'.format(len(cases), len(PAIRS), different))
+    sys.exit(1 if different else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import gzip
+
+from flask import request
+
+from metrics import BYTES_BUCKETS
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Response Compression -------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# The layout and the callback answers are JSON full of repeated keys and figure settings, they shrink ~10 times.
+# Brotli when the brotli package is installed and the browser accepts it, gzip otherwise. Responses under
+# min_bytes are sent as they are, compressing them would cost more than it saves.
+
+COMPRESSED_TYPES = ('application/json', 'application/javascript', 'text/')
+
+
+def route_name(path):
+    # Label of the size histograms
+    if path.endswith('/_dash-update-component'):
+        return 'callback'
+    if path.endswith('/_dash-layout'):
+        return 'layout'
+    return 'other'
+
+
+def accepted_encoding(header):
+    # 'br' or 'gzip' if the Accept-Encoding header allows it (q=0 refuses), None otherwise
+    accepted = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    if brotli is not None and accepted.get('br', 0) > 0:
+        return 'br'
+    if accepted.get('gzip', 0) > 0:
+        return 'gzip'
+    return None
+
+
+class Compression:
+
+    def __init__(self, enabled=True, min_bytes=1024, level=6, metrics=None):
+        self.enabled = enabled
+        self.min_bytes = min_bytes
+        self.level = level
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.define('response_bytes', 'Size of the responses before compression', BYTES_BUCKETS, 'route')
+            metrics.define('response_compressed_bytes', 'Size of the responses as sent, compressed or not',
+                           BYTES_BUCKETS, 'route')
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            # Same level for both: brotli 6 is about as fast as gzip 6 and smaller, its maximum 11 is far too slow
+            return brotli.compress(data, quality=self.level)
+        return gzip.compress(data, compresslevel=self.level, mtime=0)
+
+    def install(self, server):
+        # Before metrics.install: the after_request hooks run last registered first, so the payload sizes of the
+        # metrics are read from the JSON before it is compressed here
+        if not self.enabled:
+            return
+
+        @server.after_request
+        def compress_response(response):
+            if response.status_code != 200 or response.direct_passthrough or response.is_streamed or \
+                    'Content-Encoding' in response.headers or \
+                    not response.mimetype.startswith(COMPRESSED_TYPES):
+                return response
+            response.vary.add('Accept-Encoding')
+            data = response.get_data()
+            encoding = accepted_encoding(request.headers.get('Accept-Encoding', ''))
+            if encoding is not None and len(data) >= self.min_bytes:
+                response.set_data(self.compress(data, encoding))
+                response.headers['Content-Encoding'] = encoding
+            if self.metrics is not None and self.metrics.enabled:
+                route = route_name(request.path)
+                self.metrics.observe('response_bytes', route, len(data))
+                self.metrics.observe('response_compressed_bytes', route, response.content_length)
+            return response
@@ -0,0 +1,423 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import base64
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+import dataset
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Aggregate Cube -------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+CUBE_VERSION = 1
+
+# Number of set bits for every possible byte, used to count the athletes in a packed bitset
+POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+
+def codes_of(series):
+    # Integer codes + dictionary of a column, whatever its dtype
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return series.cat.codes.to_numpy(dtype=np.int64), list(series.cat.categories)
+    codes, uniques = pd.factorize(series, sort=True)
+    return codes.astype(np.int64), list(uniques)
+
+
+def extend_dictionary(values, series):
+    # values + the new values of the series (sorted), existing codes never move
+    known = set(values)
+    new_values = sorted({value for value in pd.unique(series.astype(object)) if value not in known})
+    return values + new_values
+
+
+def encode(series, values):
+    # Codes of the series in the dictionary values (every value of the series must be in it)
+    index = pd.Index(values)
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return index.get_indexer(series.cat.categories).astype(np.int64)[series.cat.codes.to_numpy()]
+    return index.get_indexer(series.astype(object)).astype(np.int64)
+
+
+def fold_codes(series, dictionary):
+    # Codes of the series in dictionary (value -> code), which gets the new values with the next codes
+    codes, values = pd.factorize(series)
+    lookup = np.array([dictionary.setdefault(value, len(dictionary)) for value in values], dtype=np.int32)
+    return lookup[codes]
+
+
+def sorted_dictionary(dictionary, codes):
+    # (values sorted like extend_dictionary does, codes mapped to them)
+    values = np.array(list(dictionary), dtype=object)
+    order = np.argsort(values, kind='stable')
+    remap = np.empty(len(order), dtype=np.int32)
+    remap[order] = np.arange(len(order), dtype=np.int32)
+    return values[order].tolist(), remap[codes]
+
+
+class AggregateCube:
+    # Medal counts over Year x Country_Name x Gender x Sport, built once at startup.
+    # Every filter of the dashboard (a range of Games + a set of countries) is a slice of the cube,
+    # so the callbacks sum a few thousand cells instead of pivoting the 36k medal rows.
+    # Distinct entities (athletes, events, ...) can't be summed, the same athlete wins medals in several
+    # Games, so for each column of distinct_columns the cube keeps one packed bitset of the entities per
+    # non-empty (Year, Country_Name, Gender) cell, and a filter OR-s the bitsets of its cells.
+    #
+    # A cube is never modified once built: appended() returns a new cube with the extra rows, so the
+    # callbacks running on the current cube are not disturbed by a new edition being loaded.
+
+    def __init__(self, df=None, distinct_columns=('Athlete',)):
+        self.years = np.empty(0, dtype=np.int64)
+        self.countries, self.genders, self.sports = [], [], []
+        self.country_index = {}
+        self.selections = {}
+        self.counts = np.zeros((0, 0, 0, 0), dtype=np.int32)
+        self.counts_ycg = np.zeros((0, 0, 0), dtype=np.int32)
+        # -- Cells of the distinct entities bitsets, the last row of every bitset table is left empty
+        self.cells = np.full((0, 0, 0), -1, dtype=np.int32)
+        self.n_cells = 0
+        # column -> (bitsets, dictionary of the entities)
+        self.distinct = {column: (np.zeros((1, 0), dtype=np.uint8), []) for column in distinct_columns}
+        # column -> the same bits sorted by country (see country_layout), built on first use
+        self.layouts = {}
+        if df is not None:
+            self.add_rows(df)
+
+    def appended(self, df):
+        # New cube = this cube + the rows of df, only the cells of those rows are computed
+        cube = AggregateCube.__new__(AggregateCube)
+        cube.__dict__.update(self.__dict__)
+        cube.add_rows(df)
+        return cube
+
+    def add_rows(self, df):
+        # -- Dictionaries, new values go at the end (new years are inserted in order)
+        years = np.union1d(self.years, df['Year'].to_numpy(dtype=np.int64))
+        countries = extend_dictionary(self.countries, df['Country_Name'])
+        genders = extend_dictionary(self.genders, df['Gender'])
+        sports = extend_dictionary(self.sports, df['Sport'])
+        distinct = {}
+        for column, (_, entities) in self.distinct.items():
+            entities = extend_dictionary(entities, df[column])
+            distinct[column] = (entities, encode(df[column], entities))
+        codes = (np.searchsorted(years, df['Year'].to_numpy(dtype=np.int64)), encode(df['Country_Name'], countries),
+                 encode(df['Gender'], genders), encode(df['Sport'], sports))
+        self.add_codes(years, countries, genders, sports, codes, distinct)
+
+    def add_codes(self, years, countries, genders, sports, codes, distinct):
+        # Rows given as codes in dictionaries that extend the ones of the cube: (year, country, gender, sport)
+        # codes, and for each distinct column its new dictionary + the codes of the rows in it
+        old_shape = self.counts.shape
+        old_years = self.years
+        self.years, self.countries, self.genders, self.sports = years, countries, genders, sports
+        self.country_index = {country: i for i, country in enumerate(self.countries)}
+        self.selections = {}
+        self.layouts = {}
+        shape = (len(self.years), len(self.countries), len(self.genders), len(self.sports))
+
+        year_codes, country_codes, gender_codes, sport_codes = codes
+        year_positions = np.searchsorted(self.years, old_years)
+
+        # -- Medal counts
+        counts = np.zeros(shape, dtype=np.int32)
+        counts[year_positions, :old_shape[1], :old_shape[2], :old_shape[3]] = self.counts
+        np.add.at(counts, (year_codes, country_codes, gender_codes, sport_codes), 1)
+        self.counts = counts
+        self.counts_ycg = counts.sum(axis=3)
+
+        # -- Cells, the new (Year, Country_Name, Gender) cells get the next row numbers
+        cells = np.full(shape[:3], -1, dtype=np.int32)
+        cells[year_positions, :old_shape[1], :old_shape[2]] = self.cells
+        cell_codes = np.ravel_multi_index((year_codes, country_codes, gender_codes), shape[:3])
+        new_cells = np.unique(cell_codes[cells.flat[cell_codes] < 0])
+        cells.flat[new_cells] = np.arange(self.n_cells, self.n_cells + len(new_cells), dtype=np.int32)
+        cell_rows = cells.flat[cell_codes]
+        self.cells = cells
+        old_cells, self.n_cells = self.n_cells, self.n_cells + len(new_cells)
+
+        # -- Distinct entities
+        bitsets = {}
+        for column, (old_bits, _) in self.distinct.items():
+            entities, entity_codes = distinct[column]
+            bits = np.zeros((self.n_cells + 1, (len(entities) + 7) // 8), dtype=np.uint8)
+            bits[:old_cells, :old_bits.shape[1]] = old_bits[:-1]
+            np.bitwise_or.at(bits, (cell_rows, entity_codes >> 3), (0x80 >> (entity_codes & 7)).astype(np.uint8))
+            bitsets[column] = (bits, entities)
+        self.distinct = bitsets
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Snapshot
+    # ___________________________________________________________________________________________________________________#
+
+    # Like the dataset snapshot: the arrays are saved as .npy files and memory-mapped read only, so every
+    # gunicorn worker of the same CSV maps the same pages instead of building its own cube.
+
+    def save(self, directory, source):
+        tmp_dir = dataset.make_tmp_dir(directory)
+        arrays = dict(years=self.years, counts=self.counts, counts_ycg=self.counts_ycg, cells=self.cells)
+        for column, (bits, _) in self.distinct.items():
+            arrays['distinct-' + column] = bits
+        for name, values in arrays.items():
+            np.save(os.path.join(tmp_dir, name + '.npy'), values, allow_pickle=False)
+        with open(os.path.join(tmp_dir, dataset.MANIFEST), 'w') as handle:
+            json.dump(dict(version=CUBE_VERSION, source=source, arrays=sorted(arrays), countries=self.countries,
+                           genders=self.genders, sports=self.sports, n_cells=self.n_cells,
+                           distinct={column: list(entities) for column, (_, entities) in self.distinct.items()}),
+                      handle)
+        dataset.swap_dir(tmp_dir, directory)
+
+    @classmethod
+    def load(cls, directory, source, distinct_columns=('Athlete',)):
+        # None when there is no cube of this source (CSV fingerprint) and these distinct columns
+        manifest = dataset.read_manifest(directory)
+        if manifest is None or manifest.get('version') != CUBE_VERSION or manifest.get('source') != source or \
+                sorted(manifest['distinct']) != sorted(distinct_columns):
+            return None
+        arrays = {name: np.load(os.path.join(directory, name + '.npy'), mmap_mode='r', allow_pickle=False)
+                  for name in manifest['arrays']}
+        cube = cls()
+        cube.years, cube.counts, cube.counts_ycg, cube.cells = \
+            arrays['years'], arrays['counts'], arrays['counts_ycg'], arrays['cells']
+        cube.countries, cube.genders, cube.sports = manifest['countries'], manifest['genders'], manifest['sports']
+        cube.country_index = {country: i for i, country in enumerate(cube.countries)}
+        cube.n_cells = manifest['n_cells']
+        cube.distinct = {column: (arrays['distinct-' + column], entities)
+                         for column, entities in manifest['distinct'].items()}
+        return cube
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Filter -> Slices
+    # ___________________________________________________________________________________________________________________#
+
+    def year_slice(self, year):
+        return slice(*dataset.year_range(self.years, year))
+
+    def country_selector(self, country):
+        # An empty dropdown means every country, unknown names are ignored like in isin
+        if not country:
+            return slice(None)
+        return np.array(sorted({self.country_index[c] for c in country if c in self.country_index}), dtype=np.int64)
+
+    def selection(self, year, country):
+        # The year slice and country index of a filter, shared by every query made for the same filter
+        key = (tuple(year), tuple(country or ()))
+        selectors = self.selections.get(key)
+        if selectors is None:
+            selectors = (self.year_slice(year), self.country_selector(country))
+            if len(self.selections) >= 1024:
+                self.selections.clear()
+            self.selections[key] = selectors
+        return selectors
+
+    def select(self, cube, year, country):
+        years, countries = self.selection(year, country)
+        return cube[years][:, countries]
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Queries
+    # ___________________________________________________________________________________________________________________#
+
+    def count_entities(self, present):
+        # present: boolean (entity x gender) -> total, per gender
+        return int(present.any(axis=1).sum()), {gender: int(present[:, g].sum()) for g, gender in
+                                                enumerate(self.genders)}
+
+    def countries_per_gender(self, year, country):
+        counts = self.select(self.counts_ycg, year, country).sum(axis=0)
+        return self.count_entities(counts > 0)
+
+    def sports_per_gender(self, year, country):
+        counts = self.select(self.counts, year, country).sum(axis=(0, 1)).T
+        return self.count_entities(counts > 0)
+
+    def group_bitsets(self, column, cells, groups, n_groups):
+        # OR of the bitsets of the cells of each group, in one pass: every group also gets the empty row
+        # (so a group without medals is just an empty bitset) and the sorted groups are OR-ed with reduceat
+        bits = self.distinct[column][0]
+        selected = cells >= 0
+        rows = np.concatenate([cells[selected], np.full(n_groups, len(bits) - 1)])
+        groups = np.concatenate([groups[selected], np.arange(n_groups)])
+        order = np.argsort(groups, kind='stable')
+        starts = np.searchsorted(groups[order], np.arange(n_groups))
+        # OR-ed 8 bytes at a time (~7x faster than byte by byte), the bitsets padded to a multiple of 8 bytes
+        gathered = bits[rows[order]]
+        width = gathered.shape[1]
+        if width % 8:
+            gathered = np.concatenate([gathered, np.zeros((len(gathered), 8 - width % 8), dtype=np.uint8)], axis=1)
+        return np.bitwise_or.reduceat(gathered.view(np.uint64), starts, axis=0).view(np.uint8)[:, :width]
+
+    def distinct_per_gender(self, column, year, country):
+        # Distinct values of a column in the selection, in total and per gender: the selected cells grouped by
+        # gender
+        cells = self.select(self.cells, year, country)
+        genders = np.broadcast_to(np.arange(len(self.genders)), cells.shape)
+        per_gender = self.group_bitsets(column, cells, genders, len(self.genders))
+        total = int(POPCOUNT[np.bitwise_or.reduce(per_gender, axis=0)].sum())
+        counts = POPCOUNT[per_gender].sum(axis=1)
+        return total, {gender: int(counts[g]) for g, gender in enumerate(self.genders)}
+
+    def athletes_per_gender(self, year, country):
+        return self.distinct_per_gender('Athlete', year, country)
+
+    def medals_per_gender(self, year, country):
+        counts = self.select(self.counts_ycg, year, country).sum(axis=(0, 1))
+        return {gender: int(counts[g]) for g, gender in enumerate(self.genders)}
+
+    def medals_per_year(self, year, country):
+        # DataFrame Year x Gender, only the Games and genders with medals, NaN where a gender has none
+        years = self.year_slice(year)
+        counts = self.select(self.counts_ycg, year, country).sum(axis=1)
+        table = pd.DataFrame(counts, index=pd.Index(self.years[years], name='Year'),
+                             columns=pd.Index(self.genders, name='Gender'), dtype=float)
+        table = table[table.sum(axis=1) > 0]
+        table = table.loc[:, table.sum(axis=0) > 0]
+        return table.replace(0, np.nan)
+
+    def country_layout(self, column):
+        # Every bit set in the bitsets of a distinct column as (country, gender, entity, Games) entries sorted in
+        # that order, + the first entry of each country: the entities of any set of countries are as many
+        # contiguous runs, read without gathering and OR-ing their bitsets
+        layout = self.layouts.get(column)
+        if layout is None:
+            bits = self.distinct[column][0][:self.n_cells]
+            rows, offsets = np.nonzero(bits)
+            entries, bit = np.nonzero(np.unpackbits(bits[rows, offsets][:, None], axis=1))
+            rows, entities = rows[entries], offsets[entries].astype(np.int64) * 8 + bit
+            # (Year, Country_Name, Gender) of every cell row
+            cell_years, cell_countries, cell_genders = np.nonzero(self.cells >= 0)
+            cell_of = np.empty((3, self.n_cells), dtype=np.int64)
+            cell_of[:, self.cells[cell_years, cell_countries, cell_genders]] = \
+                cell_years, cell_countries, cell_genders
+            years, countries, genders = cell_of[:, rows]
+            order = np.lexsort((years, entities, genders, countries))
+            layout = dict(years=years[order], genders=genders[order], entities=entities[order],
+                          starts=np.searchsorted(countries[order], np.arange(len(self.countries) + 1)))
+            self.layouts[column] = layout
+        return layout
+
+    def distinct_per_country(self, column, years, countries):
+        # Distinct entities per (country, gender) of the year slice, countries: their sorted codes. The runs of
+        # the countries are read at once and an entity counts once per (country, gender), whatever its Games.
+        layout = self.country_layout(column)
+        starts, lengths = layout['starts'][countries], np.diff(layout['starts'])[countries]
+        entries = np.arange(lengths.sum()) + np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+        groups = np.repeat(np.arange(len(countries)) * len(self.genders), lengths) + layout['genders'][entries]
+        inside = (layout['years'][entries] >= years.start) & (layout['years'][entries] < years.stop)
+        groups, entities = groups[inside], layout['entities'][entries[inside]]
+        first = np.ones(len(groups), dtype=bool)
+        first[1:] = (groups[1:] != groups[:-1]) | (entities[1:] != entities[:-1])
+        return np.bincount(groups[first], minlength=len(countries) * len(self.genders)) \
+            .reshape(len(countries), len(self.genders))
+
+    def compare_countries(self, year, country):
+        # The selected countries side by side, all of them in one pass over Year x Country x Gender (x Sport)
+        # instead of one query per country (an empty dropdown compares every country)
+        years, countries = self.selection(year, country)
+        if isinstance(countries, slice):
+            countries = np.arange(len(self.countries))
+        per_year = self.counts_ycg[years][:, countries].transpose(1, 0, 2)
+        sports = (self.counts[years][:, countries].sum(axis=0) > 0).sum(axis=2)
+        athletes = self.distinct_per_country('Athlete', years, countries)
+        return comparison_tables([self.countries[c] for c in countries], self.years[years], self.genders,
+                                 per_year, athletes, sports)
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Browser Payload
+    # ___________________________________________________________________________________________________________________#
+
+    def compact_counts(self):
+        # The non-empty (Year, Country_Name, Gender) cells with their medals and the bitmask of their sports, as
+        # little-endian typed arrays in base64: enough for assets/clientside.js to count the medals, countries and
+        # sports of any filter in the browser. The athletes would need the bitsets, they stay on the server.
+        years, countries, genders = np.nonzero(self.counts_ycg)
+        sports = np.packbits(self.counts[years, countries, genders] > 0, axis=1)
+
+        def typed(values, dtype):
+            return base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode('ascii')
+
+        return dict(years=[int(year) for year in self.years], countries=self.countries, genders=self.genders,
+                    sport_bytes=int(sports.shape[1]),
+                    year=typed(years, '<u2'), country=typed(countries, '<u2'), gender=typed(genders, 'u1'),
+                    medals=typed(self.counts_ycg[years, countries, genders], '<u4'), sports=typed(sports, 'u1'))
+
+
+def comparison_tables(countries, years, genders, per_year, athletes, sports):
+    # per_year: Country x Year x Gender medals, athletes and sports: Country x Gender ->
+    # (KPIs: Country_Name x Medals_<gender>, Athletes_<gender>, Sports_<gender>,
+    #  medals: one row per Country_Name and Year with medals, a column per gender).
+    # The countries without medals in the selection are left out.
+    medals = per_year.sum(axis=1)
+    keep = medals.sum(axis=1) > 0
+    countries = np.array(countries, dtype=object)[keep]
+    per_year, medals, athletes, sports = per_year[keep], medals[keep], athletes[keep], sports[keep]
+
+    kpis = pd.DataFrame({'{}_{}'.format(name, gender): values[:, g].astype(np.int64)
+                         for name, values in [('Medals', medals), ('Athletes', athletes), ('Sports', sports)]
+                         for g, gender in enumerate(genders)},
+                        index=pd.Index(countries, name='Country_Name'))
+
+    country, year = np.nonzero(per_year.sum(axis=2))
+    table = pd.DataFrame(dict(Country_Name=countries[country], Year=np.asarray(years, dtype=np.int64)[year],
+                              **{gender: per_year[country, year, g].astype(np.int64)
+                                 for g, gender in enumerate(genders)}))
+    return kpis, table
+
+
+class CubeBuilder:
+    # Folds the chunks of medal rows of the CSV as they are parsed, into their codes only (a few bytes per row),
+    # and builds the cube once at the end. The dictionaries are dicts that grow with the new values, and the
+    # counts and bitsets are allocated once at their final size: AggregateCube.add_rows on every chunk would copy
+    # the whole cube each time, its peak memory being the size of two cubes whatever the size of the chunks.
+
+    def __init__(self, distinct_columns=('Athlete',)):
+        self.distinct_columns = tuple(distinct_columns)
+        self.dictionaries = {column: {} for column in ('Country_Name', 'Gender', 'Sport') + self.distinct_columns}
+        self.codes = {column: [] for column in ('Year',) + tuple(self.dictionaries)}
+
+    def add_rows(self, df):
+        self.codes['Year'].append(df['Year'].to_numpy(dtype=np.int64))
+        for column, dictionary in self.dictionaries.items():
+            self.codes[column].append(fold_codes(df[column], dictionary))
+
+    def build(self):
+        # Same cube as AggregateCube(every row): sorted dictionaries
+        codes = {column: np.concatenate(chunks) for column, chunks in self.codes.items()}
+        self.codes = {column: [] for column in self.codes}
+        sorted_codes = {column: sorted_dictionary(dictionary, codes.pop(column))
+                        for column, dictionary in self.dictionaries.items()}
+        years = np.unique(codes['Year'])
+        (countries, country_codes), (genders, gender_codes), (sports, sport_codes) = \
+            [sorted_codes[column] for column in ('Country_Name', 'Gender', 'Sport')]
+        cube = AggregateCube(distinct_columns=self.distinct_columns)
+        cube.add_codes(years, countries, genders, sports,
+                       (np.searchsorted(years, codes['Year']), country_codes, gender_codes, sport_codes),
+                       {column: sorted_codes[column] for column in self.distinct_columns})
+        return cube
+
+
+def load_data(csv_path=dataset.CSV_PATH, snapshot_dir=dataset.SNAPSHOT_DIR, cube_dir=dataset.CUBE_DIR,
+              distinct_columns=('Athlete',)):
+    # Dataset + cube. Both are memory-mapped from their snapshots when they were built from this CSV, otherwise
+    # the chunks of the CSV are folded by a CubeBuilder while it is parsed, and the cube is saved for the next workers
+    fingerprint = dataset.csv_fingerprint(csv_path)
+    source = fingerprint['sha1']
+    try:
+        cube = AggregateCube.load(cube_dir, source, distinct_columns)
+    except (OSError, ValueError, KeyError):
+        cube = None
+    if cube is not None:
+        return dataset.load_dataset(csv_path, snapshot_dir, fingerprint=fingerprint), cube
+
+    builder = CubeBuilder(distinct_columns)
+    df = dataset.load_dataset(csv_path, snapshot_dir, on_rows=builder.add_rows, fingerprint=fingerprint)
+    cube = builder.build()
+    try:
+        cube.save(cube_dir, source)
+    except OSError:
+        pass
+    return df, cube
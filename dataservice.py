@@ -0,0 +1,437 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import argparse
+import asyncio
+import concurrent.futures
+import contextlib
+import http.client
+import itertools
+import json
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Data Service ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Opt-in: with OLYMPICS_DATA_SERVICE set, the filter callbacks of the web workers send their queries to data
+# service processes, which keep the dataset, the cube and the indexes hot, instead of computing them. The web
+# workers only keep the columnar dataset to build the page, so there can be many of them, and the service gets as
+# many processes as the computations need (they share the memory-mapped snapshots).
+#
+# The service is a small asyncio HTTP/1.1 server (JSON, keep-alive) on a unix socket or on TCP:
+#   POST /query    {"fingerprint": ..., "name", "year", "country", "filters"} -> {"result"}
+#   POST /drill    {"fingerprint": ..., "selection", "search"} -> {"result": the answer of app.drill_down}
+#   POST /heatmap  {"fingerprint": ...} -> {"figures": the Gender_Participation and Gender_Swap figures + the
+#                  compact counts of the clientside callbacks}
+#   GET  /healthz
+# The requests are answered by the functions of app, in threads so the loop keeps reading the other connections.
+# Every filter callback needs one query: one round-trip on an idle keep-alive connection. The fingerprint is the
+# one of the data of the web worker: a service behind it checks for new editions first, and answers 409 if it
+# still doesn't have them.
+#
+#   python dataservice.py --bind unix:/tmp/olympics-data.sock --processes 2
+#   OLYMPICS_DATA_SERVICE=unix:/tmp/olympics-data.sock.0,unix:/tmp/olympics-data.sock.1 gunicorn app:server
+
+# Answers of app.query, + the gender gap trend
+QUERIES = ['countries_per_gender', 'athletes_per_gender', 'sports_per_gender', 'medals_per_gender',
+           'medals_per_year', 'compare_countries', 'gender_gap_trend']
+
+HEALTH_PATH = '/healthz'
+
+
+class DataServiceError(Exception):
+    pass
+
+
+def parse_address(address):
+    # 'unix:/path/to/socket' -> ('unix', path), 'host:port' -> ('tcp', (host, port))
+    if address.startswith('unix:'):
+        return 'unix', address[len('unix:'):]
+    host, _, port = address.rpartition(':')
+    return 'tcp', (host or '127.0.0.1', int(port))
+
+
+def process_addresses(bind, processes):
+    # One address per service process: the socket path + '.0', '.1', ... or the port + 0, 1, ...
+    if processes == 1:
+        return [bind]
+    kind, where = parse_address(bind)
+    if kind == 'unix':
+        return ['unix:{}.{}'.format(where, i) for i in range(processes)]
+    return ['{}:{}'.format(where[0], where[1] + i) for i in range(processes)]
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Encoding
+# ___________________________________________________________________________________________________________________#
+
+# The answers are tuples, dicts and DataFrames (medals per year, comparison, gender gap trend). A DataFrame goes
+# as its values + labels and comes back as a DataFrame. NaN are kept (JSON extension of the json module).
+
+def encode(value):
+    if hasattr(value, 'to_dict') and hasattr(value, 'columns'):
+        split = value.to_dict('split')
+        return dict(frame=dict(index=split['index'], columns=split['columns'], data=split['data'],
+                               index_name=value.index.name, columns_name=value.columns.name))
+    if isinstance(value, (tuple, list)):
+        return [encode(item) for item in value]
+    if isinstance(value, dict):
+        return {key: encode(item) for key, item in value.items()}
+    return value
+
+
+def decode(value):
+    if isinstance(value, dict) and set(value) == {'frame'}:
+        import pandas as pd
+        frame = value['frame']
+        table = pd.DataFrame(frame['data'], index=pd.Index(frame['index'], name=frame['index_name']),
+                             columns=pd.Index(frame['columns'], name=frame['columns_name']))
+        return table
+    if isinstance(value, list):
+        return tuple(decode(item) for item in value)
+    if isinstance(value, dict):
+        return {key: decode(item) for key, item in value.items()}
+    return value
+
+
+def plain(value):
+    # numpy scalars and arrays left in the answers
+    if hasattr(value, 'tolist'):
+        return value.tolist()
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Server
+# ___________________________________________________________________________________________________________________#
+
+class DataService:
+
+    def __init__(self, app, threads=2):
+        # app: the app module, loaded in this process without OLYMPICS_DATA_SERVICE so it computes the queries
+        self.app = app
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=threads)
+        # Incremented by the loop and by the threads of the executor
+        self.lock = threading.Lock()
+        self.counters = dict(requests=0, queries=0, errors=0, stale=0)
+
+    def count(self, name):
+        with self.lock:
+            self.counters[name] += 1
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters)
+
+    def fingerprint(self):
+        return self.app.snapshot.df.attrs['fingerprint']
+
+    def catch_up(self, fingerprint):
+        # True when this process has the data of the web worker, after looking for new editions
+        self.app.ingest_new_editions()
+        if not fingerprint or fingerprint == self.fingerprint():
+            return True
+        # The web worker saw an edition before the check interval of this process
+        self.app.editions_checked[0] = 0.0
+        self.app.ingest_new_editions()
+        return fingerprint == self.fingerprint()
+
+    def query(self, name, year, country=None, filters=()):
+        if name not in QUERIES:
+            raise KeyError(name)
+        data = self.app.snapshot
+        if name == 'gender_gap_trend':
+            return self.app.gender_gap_trend(data, year, country, filters)
+        self.app.select(data, year, country, filters)
+        return self.app.query(data, name, year, country, filters)
+
+    def answer(self, path, request):
+        # (status, payload) of a POST
+        if not self.catch_up(request.get('fingerprint')):
+            self.count('stale')
+            return 409, dict(error='the data service does not have this data', fingerprint=self.fingerprint())
+        data = self.app.snapshot
+        if path == '/heatmap':
+            figures = {name: data.static_figures[name] for name in ['Gender_Participation', 'Gender_Swap']}
+            figures['compact_counts'] = data.cube.compact_counts()
+            return 200, dict(fingerprint=data.df.attrs['fingerprint'], figures=figures)
+        self.count('queries')
+        if path == '/drill':
+            result = self.app.drill_down(data, request['selection'], request['search'])
+        else:
+            result = self.query(request['name'], request['year'], request['country'], request['filters'])
+        return 200, dict(fingerprint=data.df.attrs['fingerprint'], result=encode(result))
+
+    async def route(self, method, path, body):
+        if method == 'GET' and path == HEALTH_PATH:
+            return 200, dict(status='ok', loaded=self.app.loaded.is_set(), fingerprint=self.fingerprint(),
+                             stats=self.stats())
+        if method != 'POST' or path not in ('/query', '/drill', '/heatmap'):
+            return 404, dict(error='no route {} {}'.format(method, path))
+        try:
+            request = json.loads(body or b'{}')
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.executor, self.answer, path, request)
+        except (ValueError, KeyError, TypeError) as error:
+            self.count('errors')
+            return 400, dict(error='bad query: {!r}'.format(error))
+
+    async def handle(self, reader, writer):
+        # One connection, any number of requests on it
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, path, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+
+                self.count('requests')
+                status, payload = await self.route(method, path, body)
+                data = json.dumps(payload, default=plain).encode()
+                writer.write('HTTP/1.1 {} {}\r\nContent-Type: application/json\r\nContent-Length: {}\r\n\r\n'.format(
+                    status, http.client.responses.get(status, ''), len(data)).encode('latin-1') + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def run(self, address):
+        kind, where = parse_address(address)
+        if kind == 'unix':
+            if os.path.exists(where):
+                os.unlink(where)
+            server = await asyncio.start_unix_server(self.handle, where)
+        else:
+            server = await asyncio.start_server(self.handle, *where)
+        async with server:
+            await server.serve_forever()
+
+
+def serve(address, threads=2):
+    # This process computes the queries itself, whatever the environment says
+    os.environ.pop('OLYMPICS_DATA_SERVICE', None)
+    import app
+    app.warm_up()
+    service = DataService(app, threads)
+    with contextlib.suppress(KeyboardInterrupt):
+        asyncio.run(service.run(address))
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Client
+# ___________________________________________________________________________________________________________________#
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, socket_path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class DataServiceClient:
+    # Keep-alive connections to the service processes, shared by the threads of a web worker. A new connection
+    # goes to the next process in turn, the idle ones are reused last in first out.
+
+    def __init__(self, addresses=None, size=4, timeout=10.0):
+        # addresses: comma separated, None or '' = no service, the web worker computes the queries itself
+        self.addresses = [address.strip() for address in (addresses or '').split(',') if address.strip()]
+        self.timeout = timeout
+        self.idle = queue.LifoQueue(maxsize=size)
+        self.next_address = itertools.cycle(self.addresses)
+        self.lock = threading.Lock()
+        self.counters = dict(requests=0, queries=0, errors=0, connections=0)
+
+    @property
+    def enabled(self):
+        return bool(self.addresses)
+
+    def connect(self):
+        with self.lock:
+            address = next(self.next_address)
+            self.counters['connections'] += 1
+        kind, where = parse_address(address)
+        if kind == 'unix':
+            return UnixHTTPConnection(where, self.timeout)
+        return http.client.HTTPConnection(*where, timeout=self.timeout)
+
+    def release(self, connection):
+        try:
+            self.idle.put_nowait(connection)
+        except queue.Full:
+            connection.close()
+
+    def request(self, path, payload):
+        body = json.dumps(payload, default=plain).encode()
+        for attempt in range(2):
+            try:
+                # An idle connection may have been closed by a restarted service: the retry takes a new one
+                connection = self.idle.get_nowait() if attempt == 0 else self.connect()
+            except queue.Empty:
+                connection = self.connect()
+            try:
+                connection.request('POST', path, body=body, headers={'Content-Type': 'application/json'})
+                response = connection.getresponse()
+                data = response.read()
+            except (OSError, http.client.HTTPException) as error:
+                connection.close()
+                if attempt == 0:
+                    continue
+                with self.lock:
+                    self.counters['errors'] += 1
+                raise DataServiceError('data service unreachable: {!r}'.format(error)) from error
+            self.release(connection)
+            with self.lock:
+                self.counters['requests'] += 1
+            if response.status != 200:
+                with self.lock:
+                    self.counters['errors'] += 1
+                raise DataServiceError('data service answered {}: {}'.format(response.status, data[:200]))
+            return json.loads(data)
+
+    def query(self, name, year, country=None, filters=(), fingerprint=None):
+        with self.lock:
+            self.counters['queries'] += 1
+        answer = self.request('/query', dict(fingerprint=fingerprint, name=name, year=list(year),
+                                             country=list(country or []),
+                                             filters=[list(values or []) for values in filters]))
+        return decode(answer['result'])
+
+    def drill_down(self, selection, search, fingerprint=None):
+        with self.lock:
+            self.counters['queries'] += 1
+        answer = self.request('/drill', dict(fingerprint=fingerprint, selection=selection, search=search))
+        return decode(answer['result'])
+
+    def heatmap(self, fingerprint=None):
+        # The serialized Gender_Participation and Gender_Swap figures, and the compact counts
+        return self.request('/heatmap', dict(fingerprint=fingerprint))['figures']
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, idle=self.idle.qsize(), processes=len(self.addresses))
+
+
+# ___________________________________________________________________________________________________________________#
+#                                               Launcher
+# ___________________________________________________________________________________________________________________#
+
+def launch(addresses, threads=2):
+    # One service process per address, started from this file
+    here = os.path.dirname(os.path.abspath(__file__))
+    env = {name: value for name, value in os.environ.items() if name != 'OLYMPICS_DATA_SERVICE'}
+    return [subprocess.Popen([sys.executable, os.path.join(here, 'dataservice.py'), '--bind', address,
+                              '--threads', str(threads)], cwd=here, env=env)
+            for address in addresses]
+
+
+def health(address, timeout=1.0):
+    kind, where = parse_address(address)
+    connection = UnixHTTPConnection(where, timeout) if kind == 'unix' else \
+        http.client.HTTPConnection(*where, timeout=timeout)
+    try:
+        connection.request('GET', HEALTH_PATH)
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def wait_ready(addresses, processes, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    for address, process in zip(addresses, processes):
+        while True:
+            if process.poll() is not None:
+                raise DataServiceError('data service {} exited with {}'.format(address, process.returncode))
+            try:
+                if health(address).get('loaded'):
+                    break
+            except (OSError, http.client.HTTPException, ValueError):
+                pass
+            if time.monotonic() > deadline:
+                raise DataServiceError('data service {} not ready after {}s'.format(address, timeout))
+            time.sleep(0.1)
+
+
+def stop(processes):
+    for process in processes:
+        if process.poll() is None:
+            process.terminate()
+    for process in processes:
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+@contextlib.contextmanager
+def local_service(processes=1, threads=2, timeout=60.0):
+    # Stand-in for tests and local runs: service processes on unix sockets of a temporary directory, stopped on
+    # exit. Gives the value of OLYMPICS_DATA_SERVICE (or of DataServiceClient(addresses)).
+    #
+    #   with local_service() as addresses:
+    #       client = DataServiceClient(addresses)
+    directory = tempfile.mkdtemp(prefix='olympics-')
+    addresses = process_addresses('unix:' + os.path.join(directory, 'data.sock'), processes)
+    started = launch(addresses, threads)
+    try:
+        wait_ready(addresses, started, timeout)
+        yield ','.join(addresses)
+    finally:
+        stop(started)
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Data service of the filter callbacks')
+    parser.add_argument('--bind', default=os.environ.get('OLYMPICS_DATA_SERVICE_BIND', 'unix:/tmp/olympics-data.sock'),
+                        help="'unix:/path/to/socket' or 'host:port'")
+    parser.add_argument('--processes', type=int, default=1, help='service processes, on an address each')
+    parser.add_argument('--threads', type=int, default=2, help='threads computing the queries, per process')
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        serve(args.bind, args.threads)
+        return
+
+    addresses = process_addresses(args.bind, args.processes)
+    started = launch(addresses, args.threads)
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        wait_ready(addresses, started)
+        print('OLYMPICS_DATA_SERVICE={}'.format(','.join(addresses)), flush=True)
+        for process in started:
+            process.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop(started)
+
+
+if __name__ == '__main__':
+    main()
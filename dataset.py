@@ -0,0 +1,385 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Dataset Settings -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# The medal table is bundled with the app, next to this file
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CSV_PATH = os.environ.get('OLYMPICS_CSV', os.path.join(BASE_DIR, 'OlympicGames1896to2014.csv'))
+SNAPSHOT_DIR = os.environ.get('OLYMPICS_SNAPSHOT_DIR', os.path.join(BASE_DIR, 'snapshot'))
+# Arrays of the aggregate cube of the same CSV, memory-mapped by every worker (see cube.load_cube)
+CUBE_DIR = os.environ.get('OLYMPICS_CUBE_DIR', os.path.join(BASE_DIR, 'snapshot-cube'))
+
+# Low cardinality columns are stored as categorical codes + one dictionary per column. The dictionaries are
+# shared by every frame derived from the dataset and, through the snapshot, by every worker.
+# Athlete (26k names for 37k medals) stays a string column.
+CATEGORICAL_COLUMNS = ['City', 'Sport', 'Discipline', 'Country_Code', 'Gender', 'Event', 'Medal', 'Season',
+                       'Country_Name']
+INTEGER_COLUMNS = {'Year': np.int16}
+
+# Columns of the medal rows, in the order of the CSV. Other columns of a source file (e.g. the Age or Height of
+# athlete level data) are not read.
+COLUMNS = ['Year', 'City', 'Sport', 'Discipline', 'Athlete', 'Country_Code', 'Gender', 'Event', 'Medal', 'Season',
+           'Country_Name']
+GENDERS = ['Men', 'Women']
+MEDALS = ['Gold', 'Silver', 'Bronze']
+
+# The CSV is parsed this many lines at a time, only the medal rows of each chunk are kept
+CHUNK_ROWS = int(os.environ.get('OLYMPICS_CSV_CHUNK_ROWS', 250000))
+
+# Physical order of the rows, a range of Games is a contiguous block of rows (see year_range)
+SORT_COLUMNS = ['Year', 'Country_Name']
+
+MANIFEST = 'manifest.json'
+SNAPSHOT_VERSION = 4
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- CSV Reading ----------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def read_csv(csv_path=CSV_PATH):
+    # The CSV parsed like the app always did, plain object columns + the index column (see memory_report)
+    return pd.read_csv(csv_path,
+                       quotechar='"',
+                       header=0,
+                       delimiter=",")
+
+
+def sort_rows(df):
+    # Stable sort, the rows of a same Games and country keep the order of the CSV
+    return df.sort_values(SORT_COLUMNS, kind='mergesort').reset_index(drop=True)
+
+
+def csv_fingerprint(csv_path=CSV_PATH):
+    # Size + content hash, so a replaced CSV is detected even if the mtime is preserved
+    sha = hashlib.sha1()
+    with open(csv_path, 'rb') as handle:
+        for block in iter(lambda: handle.read(1 << 20), b''):
+            sha.update(block)
+    return dict(size=os.path.getsize(csv_path), sha1=sha.hexdigest())
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Chunked Reading ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def validate_rows(rows, source, first_line=2):
+    # Raises a ValueError naming the file and the line of the first row that breaks the schema.
+    # Rows without a medal are allowed (athlete level data), they are dropped by the caller.
+    def check(bad, message):
+        if bad.any():
+            line = first_line + int(np.flatnonzero(bad.to_numpy())[0])
+            raise ValueError('{}, line {}: {}'.format(source, line, message))
+
+    check(rows['Medal'].notna() & ~rows['Medal'].isin(MEDALS),
+          'Medal must be empty or one of {}'.format(', '.join(MEDALS)))
+    medals = rows['Medal'].notna()
+    check(medals & ~rows['Gender'].isin(GENDERS), 'Gender must be one of {}'.format(', '.join(GENDERS)))
+    for column in ['Country_Name', 'Sport', 'Athlete']:
+        check(medals & rows[column].isna(), '{} is empty'.format(column))
+
+
+def read_header(csv_path):
+    header = pd.read_csv(csv_path, nrows=0, quotechar='"', delimiter=",").columns
+    missing = [column for column in COLUMNS if column not in header]
+    if missing:
+        raise ValueError('{} is missing the columns {}'.format(csv_path, ', '.join(missing)))
+
+
+def read_csv_chunks(csv_path=CSV_PATH, chunk_rows=CHUNK_ROWS):
+    # Medal rows of the CSV, CHUNK_ROWS lines at a time with the dtypes of the dataset: the parser only holds one
+    # chunk of lines, and the non-medal rows and the other columns are dropped from each chunk
+    read_header(csv_path)
+    dtypes = dict(INTEGER_COLUMNS, **{column: 'category' for column in CATEGORICAL_COLUMNS})
+    first_line = 2
+    with pd.read_csv(csv_path, quotechar='"', header=0, delimiter=",", usecols=COLUMNS, dtype=dtypes,
+                     chunksize=chunk_rows) as reader:
+        while True:
+            try:
+                chunk = next(reader)
+            except StopIteration:
+                return
+            except (ValueError, TypeError, OverflowError) as error:
+                # e.g. an empty or non integer Year
+                raise ValueError('{}, after line {}: {}'.format(csv_path, first_line - 1, error))
+            validate_rows(chunk, csv_path, first_line)
+            first_line += len(chunk)
+            medals = chunk[chunk['Medal'].notna()][COLUMNS].reset_index(drop=True)
+            if len(medals):
+                yield medals
+
+
+def concat_rows(frames):
+    # One sorted dataset of frames with the same columns, the categorical dictionaries are merged
+    columns = {}
+    for column in frames[0].columns:
+        if isinstance(frames[0][column].dtype, pd.CategoricalDtype):
+            columns[column] = pd.Series(pd.api.types.union_categoricals(
+                [frame[column].astype('category') for frame in frames], sort_categories=True))
+        else:
+            columns[column] = pd.concat([frame[column] for frame in frames], ignore_index=True) \
+                .astype(frames[0][column].dtype)
+    return sort_rows(pd.DataFrame(columns))
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Snapshot Writing -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def make_tmp_dir(target_dir):
+    # Temporary folder next to target_dir, on the same filesystem so it can be renamed into place
+    parent = os.path.dirname(os.path.abspath(target_dir))
+    os.makedirs(parent, exist_ok=True)
+    return tempfile.mkdtemp(prefix='.snapshot-', dir=parent)
+
+
+def swap_dir(tmp_dir, target_dir):
+    # Puts the finished tmp_dir in place of target_dir, so concurrent gunicorn workers never see a half written folder
+    parent = os.path.dirname(os.path.abspath(target_dir))
+    old_dir = None
+    if os.path.isdir(target_dir):
+        old_dir = tempfile.mkdtemp(prefix='.snapshot-old-', dir=parent)
+        os.rmdir(old_dir)
+        try:
+            os.rename(target_dir, old_dir)
+        except OSError:
+            old_dir = None
+    try:
+        os.rename(tmp_dir, target_dir)
+    except OSError:
+        # Another worker won the race, its snapshot is just as good
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    if old_dir is not None:
+        shutil.rmtree(old_dir, ignore_errors=True)
+
+
+# Strings converted at a time when a string column is written to the snapshot
+STRING_ROWS = 65536
+
+
+def save_strings(path, series):
+    # .npy of fixed width strings written STRING_ROWS strings at a time: the array of the whole column (4 bytes per
+    # character of the longest string, for every row) is never built in memory
+    width = max(1, int(series.str.len().max())) if len(series) else 1
+    values = np.lib.format.open_memmap(path, mode='w+', dtype='<U{}'.format(width), shape=(len(series),))
+    for start in range(0, len(series), STRING_ROWS):
+        values[start:start + STRING_ROWS] = series.iloc[start:start + STRING_ROWS].to_numpy(dtype=str)
+    values.flush()
+
+
+def write_snapshot(df, fingerprint, snapshot_dir=SNAPSHOT_DIR):
+    # Every column is written as its own .npy file so it can be memory-mapped on the next boot.
+    # The snapshot is built in a temporary folder and swapped in at the end.
+    tmp_dir = make_tmp_dir(snapshot_dir)
+
+    columns = []
+    for name in df.columns:
+        series = df[name]
+        entry = dict(name=name, file='{}.npy'.format(len(columns)))
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            entry['kind'] = 'categorical'
+            entry['categories'] = [str(c) for c in series.cat.categories]
+            values = series.cat.codes.to_numpy()
+        elif series.dtype.kind in 'iuf':
+            entry['kind'] = 'numeric'
+            values = series.to_numpy()
+        else:
+            entry['kind'] = 'string'
+            values = None
+            save_strings(os.path.join(tmp_dir, entry['file']), series)
+        if values is not None:
+            np.save(os.path.join(tmp_dir, entry['file']), values, allow_pickle=False)
+        columns.append(entry)
+
+    with open(os.path.join(tmp_dir, MANIFEST), 'w') as handle:
+        json.dump(dict(version=SNAPSHOT_VERSION, source=fingerprint, rows=len(df), columns=columns), handle)
+
+    swap_dir(tmp_dir, snapshot_dir)
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Snapshot Reading -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def read_manifest(snapshot_dir=SNAPSHOT_DIR):
+    try:
+        with open(os.path.join(snapshot_dir, MANIFEST)) as handle:
+            return json.load(handle)
+    except (OSError, ValueError):
+        return None
+
+
+def snapshot_is_fresh(manifest, fingerprint):
+    return manifest is not None and \
+           manifest.get('version') == SNAPSHOT_VERSION and \
+           manifest.get('source') == fingerprint
+
+
+def read_snapshot(manifest, snapshot_dir=SNAPSHOT_DIR):
+    # Columns are memory-mapped read only, pages are shared between every process reading the snapshot
+    data = {}
+    for entry in manifest['columns']:
+        values = np.load(os.path.join(snapshot_dir, entry['file']), mmap_mode='r', allow_pickle=False)
+        if entry['kind'] == 'categorical':
+            dtype = pd.CategoricalDtype(entry['categories'])
+            data[entry['name']] = pd.Categorical.from_codes(values, dtype=dtype)
+        elif entry['kind'] == 'string':
+            data[entry['name']] = np.asarray(values, dtype=object)
+        else:
+            data[entry['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Dataset Loading ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def load_dataset(csv_path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR, on_rows=None, fingerprint=None):
+    # 1 - Use the snapshot if it was built from the current CSV
+    # 2 - Otherwise parse the CSV by chunks, sort its medal rows by Year and Country_Name and (re)build the snapshot
+    #     for the next boot. The medal rows of every chunk are kept and concatenated into the dataset: the chunks
+    #     bound the text being parsed, not the dataset, which is the size of the snapshot
+    # 3 - If the snapshot can't be read or written, the CSV alone is still enough to run the app
+    # on_rows(rows) receives every chunk of medal rows of the CSV as it is parsed, or the whole dataset once when it
+    # comes from the snapshot, so aggregates can be folded on the way (see cube.load_data)
+    fingerprint = fingerprint or csv_fingerprint(csv_path)
+    manifest = read_manifest(snapshot_dir)
+
+    df = None
+    if snapshot_is_fresh(manifest, fingerprint):
+        try:
+            df = read_snapshot(manifest, snapshot_dir)
+        except (OSError, ValueError, KeyError):
+            df = None
+        if df is not None and on_rows is not None:
+            on_rows(df)
+
+    if df is None:
+        chunks = []
+        for chunk in read_csv_chunks(csv_path):
+            if on_rows is not None:
+                on_rows(chunk)
+            chunks.append(chunk)
+        if not chunks:
+            raise ValueError('{} has no medal rows'.format(csv_path))
+        df = concat_rows(chunks)
+        del chunks
+        try:
+            write_snapshot(df, fingerprint, snapshot_dir)
+        except OSError:
+            pass
+
+    # Identifies the data the app is serving, e.g. to namespace cached results
+    df.attrs['fingerprint'] = fingerprint['sha1']
+    return df
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- New Editions ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Medal rows of Games held after the bundled CSV, dropped as .csv or .parquet files in this folder
+EDITIONS_DIR = os.environ.get('OLYMPICS_EDITIONS_DIR', os.path.join(BASE_DIR, 'editions'))
+
+
+def list_editions(editions_dir=EDITIONS_DIR):
+    # (path, size, mtime) of every edition file, in name order
+    try:
+        names = sorted(os.listdir(editions_dir))
+    except OSError:
+        return []
+    editions = []
+    for name in names:
+        if name.endswith(('.csv', '.parquet')) and not name.startswith('.'):
+            path = os.path.join(editions_dir, name)
+            stat = os.stat(path)
+            editions.append((path, stat.st_size, stat.st_mtime))
+    return editions
+
+
+def read_edition(path):
+    # Medal rows of a new edition, with the columns and dtypes of the dataset
+    if path.endswith('.parquet'):
+        rows = pd.read_parquet(path)
+        missing = [column for column in COLUMNS if column not in rows.columns]
+        if missing:
+            raise ValueError('{} is missing the columns {}'.format(path, ', '.join(missing)))
+        rows = rows[COLUMNS].astype(dict(INTEGER_COLUMNS, **{column: 'category' for column in CATEGORICAL_COLUMNS}))
+        validate_rows(rows, path)
+        return sort_rows(rows[rows['Medal'].notna()])
+    chunks = list(read_csv_chunks(path))
+    if not chunks:
+        raise ValueError('{} has no medal rows'.format(path))
+    return concat_rows(chunks)
+
+
+def append_rows(df, rows):
+    # New dataset with the rows added, the dictionaries of the categorical columns are extended
+    appended = concat_rows([df, rows])
+    appended.attrs.update(df.attrs)
+    return appended
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Memory Footprint -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def memory_report(csv_path=CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    # Bytes per column of the plain CSV frame (object strings + index column) and of the encoded dataset
+    before = read_csv(csv_path).memory_usage(deep=True, index=False)
+    after = load_dataset(csv_path, snapshot_dir).memory_usage(deep=True, index=False)
+    report = pd.DataFrame(dict(before=before, after=after)).fillna(0).astype(np.int64)
+    report.loc['Total'] = report.sum()
+    report['ratio'] = (report['after'] / report['before']).round(3)
+    return report
+
+
+def process_memory(pid='self'):
+    # Bytes of a process (Linux): rss, pss (shared pages divided by the processes sharing them) and
+    # uss (pages no other process shares, what one more gunicorn worker really costs)
+    fields = dict(rss='Rss:', pss='Pss:', private_clean='Private_Clean:', private_dirty='Private_Dirty:')
+    values = {}
+    try:
+        with open('/proc/{}/smaps_rollup'.format(pid)) as handle:
+            for line in handle:
+                parts = line.split()
+                for name, field in fields.items():
+                    if parts[0] == field:
+                        values[name] = int(parts[1]) * 1024
+    except OSError:
+        return {}
+    return dict(rss=values.get('rss', 0), pss=values.get('pss', 0),
+                uss=values.get('private_clean', 0) + values.get('private_dirty', 0))
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Year Range -----------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# The rows are sorted by Year (SORT_COLUMNS), the Games of the cube and of the trends too: a range of the year
+# slider is a range of positions in any of them, found with two binary searches.
+
+
+def year_range(years, year):
+    # First and last + 1 positions of the Games of the (start, end) range in the sorted years, empty when
+    # start > end
+    start = np.searchsorted(years, year[0], side='left')
+    end = np.searchsorted(years, year[1], side='right')
+    return int(start), int(max(start, end))
+
+
+if __name__ == '__main__':
+    print(memory_report())
@@ -0,0 +1,122 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import numpy as np
+import pandas as pd
+
+import dataset
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Drill-down Index -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Inverted indexes over the medal rows: for every Sport, Discipline, Event, Athlete and country, the sorted numbers
+# of its rows. The dataset is sorted by Year, so every posting list is sorted by Year too and a range of Games is
+# a slice of it (two binary searches). A drill-down intersects the posting lists of its terms, shortest first,
+# instead of scanning the dataset.
+
+INDEXED_COLUMNS = ['Sport', 'Discipline', 'Event', 'Athlete', 'Country_Name']
+
+# Columns of the rows shown by the panel
+ROW_COLUMNS = ['Year', 'Athlete', 'Country_Name', 'Discipline', 'Event', 'Gender', 'Medal']
+
+
+class PostingLists:
+    # Every posting list of a column in one array of row numbers: the rows of value v are
+    # rows[offsets[v]:offsets[v + 1]]
+
+    def __init__(self, column):
+        if isinstance(column.dtype, pd.CategoricalDtype):
+            codes, values = column.cat.codes.to_numpy(), list(column.cat.categories)
+        else:
+            codes, values = pd.factorize(column)
+            values = list(values)
+        self.code = {value: code for code, value in enumerate(values)}
+        # Stable: the rows of a value stay in the order of the dataset
+        self.rows = np.argsort(codes, kind='stable').astype(np.int32)
+        self.offsets = np.searchsorted(codes[self.rows], np.arange(len(values) + 1)).astype(np.int32)
+        # Rows without a value (code -1) sort first, skip them
+        self.rows = self.rows[np.count_nonzero(codes < 0):]
+        self.offsets -= self.offsets[0]
+
+    def get(self, value):
+        code = self.code.get(value)
+        if code is None:
+            return np.empty(0, dtype=np.int32)
+        return self.rows[self.offsets[code]:self.offsets[code + 1]]
+
+
+def intersect(postings):
+    # Rows in every posting list. Each row of the shortest list is looked up in the others by binary search,
+    # which costs len(shortest) * log(len(other)) instead of the length of both.
+    postings = sorted(postings, key=len)
+    result = postings[0]
+    for other in postings[1:]:
+        if not len(result):
+            break
+        found = np.searchsorted(other, result)
+        found[found == len(other)] = 0
+        result = result[other[found] == result]
+    return result
+
+
+class DrillDownIndex:
+
+    def __init__(self, df):
+        self.df = df
+        self.postings = {column: PostingLists(df[column]) for column in INDEXED_COLUMNS}
+        # First row of every Games, the rows being sorted by Year
+        row_years = df['Year'].to_numpy()
+        self.years = np.unique(row_years)
+        self.year_offsets = np.append(np.searchsorted(row_years, self.years), len(row_years)).astype(np.int32)
+        self.genders = list(df['Gender'].cat.categories)
+        self.gender_codes = df['Gender'].cat.codes.to_numpy()
+        # Free text search: lower case name -> (column, value), the athletes are looked up last so an event or a
+        # discipline wins over an athlete of the same name
+        self.names = {}
+        for column in ['Athlete', 'Event', 'Discipline', 'Sport']:
+            self.names.update({str(value).lower(): (column, value) for value in self.postings[column].code})
+
+    def row_range(self, year):
+        # First and last + 1 row of the Games in the (start, end) range
+        start, end = dataset.year_range(self.years, year)
+        return int(self.year_offsets[start]), int(self.year_offsets[end])
+
+    def search(self, text):
+        # (column, value) of an athlete, event, discipline or sport, case insensitive, None when unknown
+        return self.names.get((text or '').strip().lower())
+
+    def lookup(self, year=None, country=None, gender=None, rows=None, **terms):
+        # Sorted numbers of the rows matching every term, e.g. lookup((2012, 2012), Sport='Boxing', gender='Women').
+        # rows: sorted numbers of the rows of other filters (e.g. of the bitmap index) to intersect with
+        postings = [self.postings[column].get(value) for column, value in terms.items() if value is not None]
+        if rows is not None:
+            postings.append(rows)
+        if country:
+            # Union of the countries, each list sorted -> sort the concatenation
+            postings.append(np.sort(np.concatenate([self.postings['Country_Name'].get(name) for name in country])))
+        if year is not None:
+            first, last = self.row_range(year)
+            if postings:
+                postings = [rows[np.searchsorted(rows, first):np.searchsorted(rows, last)] for rows in postings]
+            else:
+                postings = [np.arange(first, last, dtype=np.int32)]
+        if not postings:
+            return self.of_gender(np.arange(len(self.df), dtype=np.int32), gender)
+        return self.of_gender(intersect(postings), gender)
+
+    def of_gender(self, rows, gender=None):
+        if gender is None:
+            return rows
+        if gender not in self.genders:
+            return rows[:0]
+        return rows[self.gender_codes[rows] == self.genders.index(gender)]
+
+    def gender_split(self, rows):
+        # {gender: number of medal rows}
+        counts = np.bincount(self.gender_codes[rows], minlength=len(self.genders))
+        return {gender: int(count) for gender, count in zip(self.genders, counts)}
+
+    def frame(self, rows, limit=None):
+        return self.df[ROW_COLUMNS].iloc[rows[:limit]]
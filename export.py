@@ -0,0 +1,94 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import argparse
+import json
+import multiprocessing
+import os
+import time
+
+import app
+import bundles
+import dataset
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Batch Export ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Computes the answers of every filter callback for every pair of year_slider marks, for the empty dropdown (all
+# countries), each country on its own and the sets of countries listed in a JSON file, and writes them as bundles
+# that the app serves with OLYMPICS_BUNDLES_DIR set.
+#
+#   python export.py --out bundles --sets country_sets.json --processes 8
+#
+# country_sets.json: [["France", "Germany"], ["Norway", "Sweden", "Denmark", "Finland"]]
+
+
+def year_pairs(years):
+    # Every (start, end) the slider can send, start <= end
+    years = [int(year) for year in years]
+    return [[start, end] for i, start in enumerate(years) for end in years[i:]]
+
+
+def export_set(task):
+    # Runs in a forked process: every slider range for one set of countries, written as one bundle
+    directory, countries = task
+    results = {}
+    for year in year_pairs(app.snapshot.values['Year']):
+        games = app.filter_key(year, countries)[0]
+        key = bundles.games_key(games)
+        if key not in results:
+            results[key] = {callback.__name__: callback(year, countries) for callback in app.FILTER_CALLBACKS}
+    path = bundles.write_bundle(directory, countries, results)
+    return bundles.set_name(countries), countries, os.path.getsize(path)
+
+
+def country_sets(each_country=True, sets_path=None):
+    sets = [[]]
+    if each_country:
+        sets += [[country] for country in app.snapshot.values['Country_Name']]
+    if sets_path:
+        with open(sets_path) as handle:
+            sets += [sorted(set(countries)) for countries in json.load(handle)]
+    # Same set listed twice -> one bundle
+    unique = {}
+    for countries in sets:
+        unique.setdefault(bundles.set_name(countries), countries)
+    return list(unique.values())
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export the answers of the filter callbacks as static bundles')
+    parser.add_argument('--out', default=os.path.join(dataset.BASE_DIR, 'bundles'), help='bundles folder')
+    parser.add_argument('--sets', help='JSON file with a list of country sets to export too')
+    parser.add_argument('--no-countries', action='store_true', help="don't export each country on its own")
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+    app.warm_up()
+    data = app.snapshot
+
+    # Every answer is computed once, no need to keep them in the cache (or to read old bundles)
+    app.result_cache.enabled = False
+    app.bundles.manifest = None
+
+    sets = country_sets(not args.no_countries, args.sets)
+    tmp_dir = dataset.make_tmp_dir(args.out)
+    start = time.perf_counter()
+    # Forked after the app is loaded: the processes share the dataset and the cube
+    with multiprocessing.get_context('fork').Pool(args.processes) as pool:
+        exported = pool.map(export_set, [(tmp_dir, countries) for countries in sets], chunksize=1)
+
+    with open(os.path.join(tmp_dir, bundles.MANIFEST), 'w') as handle:
+        json.dump(dict(version=bundles.BUNDLE_VERSION, source=data.df.attrs['fingerprint'],
+                       years=data.values['Year'],
+                       sets={name: countries for name, countries, _ in exported}), handle)
+    dataset.swap_dir(tmp_dir, args.out)
+
+    size = sum(size for _, _, size in exported)
+    print('{} country sets x {} slider ranges exported to {} in {:.1f} s, {:.1f} MB'.format(
+        len(sets), len(year_pairs(data.values['Year'])), args.out, time.perf_counter() - start, size / 1e6))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,491 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import json
+
+import numpy as np
+import pandas as pd
+import plotly.graph_objs as go
+import plotly.io as pio
+from plotly.utils import PlotlyJSONEncoder
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Static Fragments -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# The figures of the callbacks are plain dicts, Dash sends them as they are: no go.Figure, no validation of every
+# property on each request. What never changes between two requests is built (and made JSON-ready) once here.
+
+COLOR_MEN = '#87CEFA'
+COLOR_WOMEN = '#FFC0CB'
+COLOR_BOTH = '#c3e4a1'
+
+
+def to_plain(value):
+    # JSON-ready copy of a plotly object (numpy arrays -> lists, NaN -> None)
+    return json.loads(json.dumps(value, cls=PlotlyJSONEncoder))
+
+
+# Template go.Figure would have added to every layout, so the charts look the same as before
+TEMPLATE = to_plain(pio.templates[pio.templates.default].to_plotly_json())
+
+NO_DATA_ANNOTATIONS = [dict(text='No matching data found',
+                            xref="paper",
+                            yref="paper",
+                            showarrow=False,
+                            font=dict(size=12))
+                       ]
+
+HOVER_MEDALS = {gender: "Year: <b>%{x}</b><br>" +
+                        "Number of Medals: <b>%{y}</b><br>" +
+                        "Gender: <b>" + gender + "</b><br>"
+                for gender in ['Men', 'Women']}
+
+LAYOUT_GENDER_PERCENTAGE = dict(title=dict(text='Gender Percentage'), template=TEMPLATE)
+LAYOUT_GENDER_PERCENTAGE_NO_DATA = dict(title=dict(text='Gender Percentage'),
+                                        yaxis=dict(visible=False),
+                                        xaxis=dict(visible=False),
+                                        annotations=NO_DATA_ANNOTATIONS,
+                                        template=TEMPLATE)
+
+LAYOUT_GENDER_YEAR = dict(title=dict(text='Number of Medals per Gender'),
+                          yaxis=dict(title=dict(text='Number of Medals'), tickfont=dict(size=9)),
+                          xaxis=dict(title=dict(text="Year"), tickfont=dict(size=9)),
+                          template=TEMPLATE)
+LAYOUT_GENDER_YEAR_NO_DATA = dict(title=dict(text='Number of Medals per Gender'),
+                                  yaxis=dict(visible=False),
+                                  xaxis=dict(visible=False),
+                                  annotations=NO_DATA_ANNOTATIONS,
+                                  template=TEMPLATE)
+
+LAYOUT_GENDER_GAP = dict(title=dict(text='Gender Gap Trend'),
+                         yaxis=dict(title=dict(text="Women's Share of the Medals (%)"), range=[0, 100],
+                                    tickfont=dict(size=9)),
+                         xaxis=dict(title=dict(text="Year"), tickfont=dict(size=9)),
+                         legend=dict(orientation='h', y=-0.25),
+                         template=TEMPLATE)
+LAYOUT_GENDER_GAP_NO_DATA = dict(title=dict(text='Gender Gap Trend'),
+                                 yaxis=dict(visible=False),
+                                 xaxis=dict(visible=False),
+                                 annotations=NO_DATA_ANNOTATIONS,
+                                 template=TEMPLATE)
+
+COMPARISON_NO_DATA_ANNOTATIONS = [dict(NO_DATA_ANNOTATIONS[0], text='Select two or more countries to compare them')]
+
+LAYOUT_COUNTRY_KPIS = dict(title=dict(text="Women's Share per Country"),
+                           yaxis=dict(title=dict(text="Women's Share (%)"), range=[0, 100], tickfont=dict(size=9)),
+                           xaxis=dict(tickfont=dict(size=9)),
+                           barmode='group',
+                           # Parity line
+                           shapes=[dict(type='line', xref='paper', x0=0, x1=1, y0=50, y1=50,
+                                        line=dict(dash='dot', width=1, color='gray'))],
+                           template=TEMPLATE)
+LAYOUT_COUNTRY_KPIS_NO_DATA = dict(title=dict(text="Women's Share per Country"),
+                                   yaxis=dict(visible=False),
+                                   xaxis=dict(visible=False),
+                                   annotations=COMPARISON_NO_DATA_ANNOTATIONS,
+                                   template=TEMPLATE)
+LAYOUT_COUNTRY_COMPARISON_NO_DATA = dict(title=dict(text='Number of Medals per Gender and Country'),
+                                         yaxis=dict(visible=False),
+                                         xaxis=dict(visible=False),
+                                         annotations=COMPARISON_NO_DATA_ANNOTATIONS,
+                                         template=TEMPLATE)
+
+# Small multiples: countries per row of the grid, height of a row in pixels
+COMPARISON_COLUMNS = 5
+COMPARISON_ROW_HEIGHT = 170
+
+HOVER_GENDER_GAP = "Year: <b>%{x}</b><br>" + \
+                   "%{meta}: <b>%{y:.1f}%</b><br>" + \
+                   "Medals: <b>%{customdata[0]}</b> Women / <b>%{customdata[1]}</b> Men<extra></extra>"
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Plot 1  - Gender Representation Olympic Games
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+# What assets/clientside.js needs to build the same donut in the browser
+DONUT_CLIENTSIDE = dict(colors=[COLOR_MEN, COLOR_WOMEN], hole=0.60,
+                        layout=LAYOUT_GENDER_PERCENTAGE, layout_no_data=LAYOUT_GENDER_PERCENTAGE_NO_DATA)
+
+
+def gender_percentage_figure(medals_per_gender):
+    # Genders without medals in the selection are left out, the largest slice comes first
+    Gender_Counts = sorted(((medals, gender) for gender, medals in medals_per_gender.items() if medals > 0),
+                           key=lambda item: -item[0])
+
+    # Define the labels
+    label_Gender = [gender for medals, gender in Gender_Counts]
+    # Define the values
+    value_Gender = [medals for medals, gender in Gender_Counts]
+
+    data_Gender = dict(type='pie', labels=label_Gender, values=value_Gender,
+                       marker=dict(colors=DONUT_CLIENTSIDE['colors']), hole=DONUT_CLIENTSIDE['hole'])
+
+    if value_Gender == []:
+        return dict(data=[data_Gender], layout=LAYOUT_GENDER_PERCENTAGE_NO_DATA)
+    return dict(data=[data_Gender], layout=LAYOUT_GENDER_PERCENTAGE)
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Plot 2  - Gender Representation per Year
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+def gender_year_figure(df_GenderPerYear):
+    # df_GenderPerYear: Year x Gender medals, only the genders with medals, NaN where a gender has none that year
+    years = df_GenderPerYear.index.tolist()
+    colors = dict(Men=COLOR_MEN, Women=COLOR_WOMEN)
+
+    data_bar = []
+    for gender in ['Men', 'Women']:
+        if gender not in df_GenderPerYear.columns:
+            continue
+        medals = [None if np.isnan(value) else value for value in df_GenderPerYear[gender].tolist()]
+        data_bar.append(dict(type='bar',
+                             x=years,
+                             y=medals,
+                             text=medals,
+                             textposition='auto',
+                             name=gender,
+                             marker=dict(color=colors[gender]),
+                             hovertemplate=HOVER_MEDALS[gender],
+                             ))
+
+    if data_bar == []:
+        return dict(data=data_bar, layout=LAYOUT_GENDER_YEAR_NO_DATA)
+    return dict(data=data_bar, layout=LAYOUT_GENDER_YEAR)
+
+
+def gender_gap_figure(df_Gap):
+    # df_Gap: trends.trend_table, one row per Games with medals in the selection
+    if df_Gap.empty:
+        return dict(data=[], layout=LAYOUT_GENDER_GAP_NO_DATA)
+
+    years = df_Gap.index.tolist()
+
+    def share(table, column):
+        return [None if np.isnan(value) else round(value, 2) for value in table[column].tolist()]
+
+    def medals(suffix=''):
+        # [Women, Men] medals of each Games, for the hover
+        return [[int(df_Gap[gender + suffix].iloc[i]) if gender + suffix in df_Gap.columns else 0
+                 for gender in ['Women', 'Men']] for i in range(len(df_Gap))]
+
+    data_line = [dict(type='scatter', mode='lines+markers', x=years, y=share(df_Gap, 'Women_Share'),
+                      name='Per Games', meta="Women's share", customdata=medals(),
+                      line=dict(color=COLOR_WOMEN), hovertemplate=HOVER_GENDER_GAP),
+                 dict(type='scatter', mode='lines', x=years, y=share(df_Gap, 'Women_Share_Cumulative'),
+                      name='Cumulative', meta="Cumulative women's share", customdata=medals('_Cumulative'),
+                      line=dict(color=COLOR_BOTH, width=3), hovertemplate=HOVER_GENDER_GAP)]
+
+    # Games where women won their first medal in a sport, on the line of the share per Games
+    firsts = df_Gap[df_Gap['First_Women_Sports'].str.len() > 0]
+    if not firsts.empty:
+        data_line.append(dict(type='scatter', mode='markers', x=firsts.index.tolist(),
+                              y=share(firsts, 'Women_Share'),
+                              name="First women's medal in a sport",
+                              marker=dict(symbol='star', size=12, color=COLOR_MEN,
+                                          line=dict(width=1, color='#555555')),
+                              hovertext=['<br>'.join(sports) for sports in firsts['First_Women_Sports']],
+                              hovertemplate="Year: <b>%{x}</b><br>First women's medal in:<br><b>%{hovertext}</b>"
+                                            "<extra></extra>"))
+
+    return dict(data=data_line, layout=LAYOUT_GENDER_GAP)
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                        Comparison  - Countries Side by Side
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+def country_label(country):
+    return country.replace('_', ' ')
+
+
+def compared_countries(df_Kpis):
+    # Most medals first
+    medals = df_Kpis.filter(like='Medals_').sum(axis=1)
+    return medals.sort_values(ascending=False, kind='stable').index.tolist()
+
+
+def country_kpis_figure(df_Kpis):
+    # df_Kpis: cube.comparison_tables KPIs, one row per country with medals (None: less than two countries selected)
+    if df_Kpis is None:
+        return dict(data=[], layout=LAYOUT_COUNTRY_KPIS_NO_DATA)
+    if df_Kpis.empty:
+        return dict(data=[], layout=dict(LAYOUT_COUNTRY_KPIS_NO_DATA, annotations=NO_DATA_ANNOTATIONS))
+
+    df_Kpis = df_Kpis.loc[compared_countries(df_Kpis)]
+    labels = [country_label(country) for country in df_Kpis.index]
+    colors = dict(Medals=COLOR_WOMEN, Athletes=COLOR_MEN, Sports=COLOR_BOTH)
+
+    data_bar = []
+    for kpi in ['Medals', 'Athletes', 'Sports']:
+        women, men = df_Kpis[kpi + '_Women'].tolist(), df_Kpis[kpi + '_Men'].tolist()
+        share = [round(100.0 * w / (w + m), 2) if w + m else None for w, m in zip(women, men)]
+        data_bar.append(dict(type='bar',
+                             x=labels,
+                             y=share,
+                             name=kpi,
+                             marker=dict(color=colors[kpi]),
+                             customdata=[[w, m] for w, m in zip(women, men)],
+                             hovertemplate="<b>%{x}</b><br>" + kpi + ": <b>%{customdata[0]}</b> Women / "
+                                           "<b>%{customdata[1]}</b> Men<br>Women's share: <b>%{y:.1f}%</b>"
+                                           "<extra></extra>",
+                             ))
+    return dict(data=data_bar, layout=LAYOUT_COUNTRY_KPIS)
+
+
+def country_comparison_figure(df_Kpis, df_CountryYear):
+    # Small multiples of the medals per gender and year, one chart per country on the same timeline.
+    # df_CountryYear: cube.comparison_tables medals, one row per country and Games with medals
+    if df_Kpis is None:
+        return dict(data=[], layout=LAYOUT_COUNTRY_COMPARISON_NO_DATA)
+    if df_Kpis.empty:
+        return dict(data=[], layout=dict(LAYOUT_COUNTRY_COMPARISON_NO_DATA, annotations=NO_DATA_ANNOTATIONS))
+
+    countries = compared_countries(df_Kpis)
+    columns = min(COMPARISON_COLUMNS, len(countries))
+    rows = -(-len(countries) // columns)
+    colors = dict(Men=COLOR_MEN, Women=COLOR_WOMEN)
+    genders = [gender for gender in ['Men', 'Women'] if gender in df_CountryYear.columns]
+
+    # The rows of a country follow each other (comparison_tables): slices of plain lists, no lookup per country
+    names = df_CountryYear['Country_Name'].to_numpy()
+    starts = np.flatnonzero(np.r_[True, names[1:] != names[:-1]])
+    bounds = {names[start]: (start, end) for start, end in zip(starts.tolist(), starts[1:].tolist() + [len(names)])}
+    years = df_CountryYear['Year'].tolist()
+    medals = {gender: df_CountryYear[gender].tolist() for gender in genders}
+    timeline = [min(years) - 3, max(years) + 3]
+
+    data_bar = []
+    layout = dict(title=dict(text='Number of Medals per Gender and Country'),
+                  grid=dict(rows=rows, columns=columns, pattern='independent', ygap=0.45),
+                  height=120 + COMPARISON_ROW_HEIGHT * rows,
+                  barmode='stack',
+                  legend=dict(orientation='h', y=1.0, yanchor='bottom', x=1, xanchor='right'),
+                  margin=dict(t=90),
+                  annotations=[],
+                  template=TEMPLATE)
+    for i, country in enumerate(countries):
+        axis = '' if i == 0 else str(i + 1)
+        start, end = bounds[country]
+        for gender in genders:
+            data_bar.append(dict(type='bar',
+                                 x=years[start:end],
+                                 y=medals[gender][start:end],
+                                 name=gender,
+                                 legendgroup=gender,
+                                 showlegend=i == 0,
+                                 marker=dict(color=colors[gender]),
+                                 xaxis='x' + axis,
+                                 yaxis='y' + axis,
+                                 hovertemplate="<b>" + country_label(country) + "</b><br>" + HOVER_MEDALS[gender] +
+                                               "<extra></extra>",
+                                 ))
+        # Same timeline for every country, each its own medal scale
+        layout['xaxis' + axis] = dict(range=timeline, tickfont=dict(size=8))
+        layout['yaxis' + axis] = dict(tickfont=dict(size=8), rangemode='tozero')
+        layout['annotations'].append(dict(text='<b>{}</b>'.format(country_label(country)), showarrow=False,
+                                          xref='x{} domain'.format(axis), yref='y{} domain'.format(axis),
+                                          x=0.5, y=1.0, yanchor='bottom', font=dict(size=10)))
+    return dict(data=data_bar, layout=layout)
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Sports played per Gender ---------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# These figures describe the whole history of the Games, they don't depend on the filters of the app.
+# They are built once at startup with go.Figure and kept as serialized figures.
+
+# Scale of the heatmap: sports won by Women only (1), Men only (2), Both (3), 0 for the sports without medals that
+# year (left blank). The labels are the ticks of the colorbar, and of the hover of each cell ('None' for 0).
+PLAYED_BY = ['Women', 'Men', 'Both']
+PLAYED_BY_CODE = {played_by: code for code, played_by in enumerate(PLAYED_BY, start=1)}
+
+
+def sports_played_per_gender(cube, years=None, previous=None):
+    # Sport x Year table of the code of the scale (NaN when nobody won a medal).
+    # With the table of a previous cube, only the columns of the given years are computed again.
+    year_codes = np.arange(len(cube.years))
+    if previous is not None:
+        year_codes = np.searchsorted(cube.years, sorted(years))
+
+    present = cube.counts[year_codes].sum(axis=1) > 0  # Year x Gender x Sport
+    men = present[:, cube.genders.index('Men'), :]
+    women = present[:, cube.genders.index('Women'), :]
+
+    values = np.full(men.shape, np.nan)
+    values[women & ~men] = PLAYED_BY_CODE['Women']
+    values[men & ~women] = PLAYED_BY_CODE['Men']
+    values[men & women] = PLAYED_BY_CODE['Both']
+
+    # Only the sports that were ever awarded a medal, in alphabetical order
+    played = cube.counts.sum(axis=(0, 1, 2)) > 0
+    order = [s for s in np.argsort(np.asarray(cube.sports, dtype=object)) if played[s]]
+    index = pd.Index(np.asarray(cube.sports, dtype=object)[order], name='Sport')
+    columns = pd.Index(cube.years[year_codes], name='Year')
+    df_Plot = pd.DataFrame(values[:, order].T, index=index, columns=columns)
+    if previous is None:
+        return df_Plot
+
+    df_Plot_All = previous.reindex(index=index, columns=pd.Index(cube.years, name='Year'))
+    df_Plot_All[columns] = df_Plot
+    return df_Plot_All
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                       Plot 3  - Gender Participation per Sport per Year
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+def gender_participation_figure(df_Plot):
+    # One heatmap of the codes as a uint8 typed array, its hover names the code with the ticktext of the colorbar
+    y_corr = df_Plot.index
+    x_corr = df_Plot.columns.to_numpy(dtype=np.int16)
+    z_corr = df_Plot.fillna(0).to_numpy(dtype=np.uint8)
+    colorbar = dict(tickmode="array", tickvals=list(PLAYED_BY_CODE.values()), ticktext=PLAYED_BY)
+    custom = np.array(['None'] + colorbar['ticktext'], dtype=object)[z_corr]
+
+    data_corr = dict(type='heatmap',
+                     x=x_corr,
+                     y=y_corr,
+                     z=z_corr,
+                     customdata=custom,
+                     name='Gender Representation',
+                     colorscale=[[0, 'rgba(0,0,0,0)'], [0.25, 'rgba(0,0,0,0)'], [0.25, COLOR_WOMEN], [0.5, COLOR_WOMEN],
+                                 [0.5, COLOR_MEN], [0.75, COLOR_MEN], [0.75, COLOR_BOTH], [1, COLOR_BOTH]],
+                     zmin=-0.5,
+                     zmax=len(PLAYED_BY) + 0.5,
+                     hovertemplate="Year: <b>%{x}</b><br>" +
+                                   "Sport: <b>%{y}</b><br>" +
+                                   "Played by: <b>%{customdata}</b><br>",
+                     colorbar=colorbar
+                     )
+
+    layout_corr = dict(title="Sports played per Gender",
+                       autosize=False,
+                       height=800,
+                       width=800,
+                       yaxis=dict(tickfont=dict(size=9)),
+                       xaxis=dict(tickfont=dict(size=9)),
+                       annotations=[
+                           dict(text='Softball was the only Sport played exclusively by Women since 1996 until 2014',
+                                x='1996',
+                                y='Softball',
+                                bordercolor="#FFC0CB",
+                                borderwidth=1,
+                                borderpad=4,
+                                bgcolor="#f9f9f9",
+                                opacity=0.8,
+                                ay=-10,
+                                ax=-200,
+                                font=dict(size=7)),
+                           dict(text='Women boxed in 2012, in London, for the first time.',
+                                x='2012',
+                                y='Boxing',
+                                bordercolor="#FFC0CB",
+                                borderwidth=1,
+                                borderpad=4,
+                                bgcolor="#f9f9f9",
+                                opacity=0.8,
+                                ay=-45,
+                                ax=-90,
+                                font=dict(size=7))
+                       ]
+                       )
+
+    return go.Figure(data=data_corr, layout=layout_corr)
+
+
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+#                                                Plot 4  - Gender Swap
+# |||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||||#
+
+def gender_swap_figure(df_Plot):
+    # Number of sports played by Men only, Women only and Both, per Year
+    df_GenderPlayedBy = pd.DataFrame({played_by: (df_Plot == PLAYED_BY_CODE[played_by]).sum(axis=0)
+                                      for played_by in ['Both', 'Men', 'Women']}).astype(float)
+
+    df_GenderPlayedBy['Total'] = df_GenderPlayedBy.sum(axis=1)
+    df_GenderPlayedBy['Men_Percentage'] = round(100 * df_GenderPlayedBy['Men'] / df_GenderPlayedBy['Total'], 2)
+    df_GenderPlayedBy['Women_Percentage'] = round(100 * df_GenderPlayedBy['Women'] / df_GenderPlayedBy['Total'], 2)
+    df_GenderPlayedBy['Both_Percentage'] = round(100 * df_GenderPlayedBy['Both'] / df_GenderPlayedBy['Total'], 2)
+
+    data_Men = (dict(type='bar',
+                     x=df_GenderPlayedBy.index,
+                     y=df_GenderPlayedBy['Men_Percentage'],
+                     text=df_GenderPlayedBy['Men_Percentage'],
+                     textposition='auto',
+                     name="Men",
+                     marker_color=COLOR_MEN,
+                     hovertemplate="Year: <b>%{x}</b><br>" +
+                                   "Gender: <b>Men</b><br>" +
+                                   "Percentage of Participation: <b>%{y}%</b><br>",
+                     )
+                )
+
+    data_Women = (dict(type='bar',
+                       x=df_GenderPlayedBy.index,
+                       y=df_GenderPlayedBy['Women_Percentage'],
+                       text=df_GenderPlayedBy['Women_Percentage'],
+                       textposition='auto',
+                       name="Women",
+                       marker_color=COLOR_WOMEN,
+                       hovertemplate="Year: <b>%{x}</b><br>" +
+                                     "Gender: <b>Women</b><br>" +
+                                     "Percentage of Participation: <b>%{y}%</b><br>",
+                       )
+                  )
+
+    data_Both = (dict(type='bar',
+                      x=df_GenderPlayedBy.index,
+                      y=df_GenderPlayedBy['Both_Percentage'],
+                      text=df_GenderPlayedBy['Both_Percentage'],
+                      textposition='auto',
+                      name="Both",
+                      marker_color=COLOR_BOTH,
+                      hovertemplate="Year: <b>%{x}</b><br>" +
+                                    "Gender: <b>Both</b><br>" +
+                                    "Percentage of Participation: <b>%{y}%</b><br>",
+                      )
+                 )
+
+    data_bar = [data_Men, data_Women, data_Both]
+
+    layout_bar = dict(barmode='stack',
+                      title=dict(text='Percentage of Participation per Gender'),
+                      yaxis=dict(title='Percentage of Participation [%]'),
+                      xaxis=dict(title="Year"),
+                      )
+
+    return go.Figure(data=data_bar, layout=layout_bar)
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Static Figures -------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+def serialize(fig):
+    # Plain JSON-ready dict, Dash sends it as is without validating the figure again
+    return json.loads(pio.to_json(fig, validate=False))
+
+
+class StaticFigures:
+    # Serialized Gender_Participation and Gender_Swap figures + the Sport x Year table they are made of
+
+    def __init__(self, cube, years=None, previous=None):
+        self.table = sports_played_per_gender(cube, years, previous.table if previous is not None else None)
+        self.figures = dict(Gender_Participation=serialize(gender_participation_figure(self.table)),
+                            Gender_Swap=serialize(gender_swap_figure(self.table)))
+
+    def updated(self, cube, years):
+        # Figures of a cube with new rows for these years, the other columns of the heatmap are kept
+        return StaticFigures(cube, years, self)
+
+    def __getitem__(self, name):
+        return self.figures[name]
+
+
+def build_static_figures(cube):
+    return StaticFigures(cube)
@@ -0,0 +1,56 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Gunicorn Settings ----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Read by `gunicorn app:server` (see Procfile).
+# The app is loaded once in the master and the workers are forked from it, so the dataset, the cube and the
+# static figures are shared by every worker instead of being loaded by each of them. The columns and the cube
+# are memory-mapped from the snapshots, so they stay shared even with OLYMPICS_PRELOAD=0.
+#
+# With OLYMPICS_LAZY=1 the master only imports Dash and the routes, each worker loads the data in the background
+# right after it boots and answers /healthz meanwhile (the requests that need the data wait for it). The
+# memory-mapped columns and cube are still shared, the figures and the indexes are built by every worker.
+
+import gc
+import os
+import threading
+
+from startup import LAZY
+
+preload_app = os.environ.get('OLYMPICS_PRELOAD', '1') == '1'
+
+
+def when_ready(server):
+    # Everything allocated while loading the app goes to the permanent generation: the garbage collector of the
+    # workers never writes in those objects, so their pages are not copied into every worker
+    import dataset
+    if preload_app and not LAZY:
+        gc.freeze()
+    memory = dataset.process_memory()
+    if memory:
+        server.log.info('Master memory: rss %.1f MB', memory['rss'] / 1e6)
+
+
+def post_worker_init(worker):
+    if LAZY:
+        threading.Thread(target=startup_check, args=(worker,), daemon=True).start()
+    else:
+        startup_check(worker)
+
+
+def startup_check(worker):
+    # The memory this worker does not share with the others (uss), after answering a first filter.
+    # It should stay flat when workers are added, the data itself being shared.
+    import app
+    import dataset
+    app.warm_up()
+    enabled, app.result_cache.enabled = app.result_cache.enabled, False
+    try:
+        years = app.snapshot.values['Year']
+        app.update_graphs([years[0], years[-1]], [])
+    finally:
+        app.result_cache.enabled = enabled
+    memory = dataset.process_memory()
+    if memory:
+        worker.log.info('Worker %s memory: unique %.1f MB, proportional %.1f MB, rss %.1f MB', worker.pid,
+                        memory['uss'] / 1e6, memory['pss'] / 1e6, memory['rss'] / 1e6)
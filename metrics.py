@@ -0,0 +1,157 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import bisect
+import contextlib
+import json
+import threading
+import time
+
+from flask import Response, abort, g, has_request_context, request
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Metrics --------------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Opt-in timing of the callbacks, exposed in the Prometheus text format on /metrics.
+# Disabled, stage() hands out the same do-nothing context and no request hook is installed.
+
+SECONDS_BUCKETS = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]
+BYTES_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304]
+
+NO_TIMING = contextlib.nullcontext()
+
+
+class Histogram:
+    # Cumulative buckets + sum + count, the Prometheus way
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def lines(self, name, labels):
+        cumulative = 0
+        for bound, count in zip(self.buckets + ['+Inf'], self.counts):
+            cumulative += count
+            yield '{}_bucket{{{},le="{}"}} {}'.format(name, labels, bound, cumulative)
+        yield '{}_sum{{{}}} {}'.format(name, labels, self.sum)
+        yield '{}_count{{{}}} {}'.format(name, labels, self.count)
+
+
+class Metrics:
+
+    def __init__(self, enabled=False, prefix='olympics'):
+        self.enabled = enabled
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        # name -> (help, buckets, label name, {label value: Histogram})
+        self.histograms = {}
+        self.gauges = {}
+        self.define('stage_seconds', 'Time spent in each stage of the callbacks', SECONDS_BUCKETS, 'stage')
+        self.define('callback_seconds', 'Time to answer a callback request, serialization included',
+                    SECONDS_BUCKETS, 'output')
+        self.define('output_payload_bytes', 'Size of the JSON sent for each Output', BYTES_BUCKETS, 'output')
+
+    def define(self, name, help_text, buckets, label):
+        self.histograms[name] = (help_text, buckets, label, {})
+
+    def observe(self, name, label_value, value):
+        help_text, buckets, label, series = self.histograms[name]
+        with self.lock:
+            histogram = series.get(label_value)
+            if histogram is None:
+                histogram = series[label_value] = Histogram(buckets)
+            histogram.observe(value)
+
+    def gauge(self, name, help_text, read):
+        # read() -> {label: value} or a number, evaluated when /metrics is scraped
+        self.gauges[name] = (help_text, read)
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Timing
+    # ___________________________________________________________________________________________________________________#
+
+    @contextlib.contextmanager
+    def timing(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.observe('stage_seconds', stage, elapsed)
+            if has_request_context():
+                g.metrics_stages = g.get('metrics_stages', 0.0) + elapsed
+
+    def stage(self, stage):
+        if not self.enabled:
+            return NO_TIMING
+        return self.timing(stage)
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Flask
+    # ___________________________________________________________________________________________________________________#
+
+    def install(self, server, route='/metrics'):
+        if not self.enabled:
+            return
+
+        @server.before_request
+        def start_timer():
+            g.metrics_start = time.perf_counter()
+
+        @server.after_request
+        def record_callback(response):
+            if request.path.endswith('/_dash-update-component') and response.status_code == 200:
+                output = (request.get_json(silent=True) or {}).get('output', 'unknown')
+                elapsed = time.perf_counter() - g.metrics_start
+                self.observe('callback_seconds', output, elapsed)
+                # What the stages don't cover: Dash dispatch + JSON serialization of the outputs
+                self.observe('stage_seconds', 'serialization', max(0.0, elapsed - g.get('metrics_stages', 0.0)))
+                self.record_payload(response)
+            return response
+
+        @server.route(route)
+        def metrics_route():
+            # Local scrapers only
+            if request.remote_addr not in ('127.0.0.1', '::1'):
+                abort(404)
+            return Response(self.render(), mimetype='text/plain; version=0.0.4')
+
+    def record_payload(self, response):
+        # Size of every output of the response, e.g. "Gender_Year.figure"
+        try:
+            body = json.loads(response.get_data())
+        except ValueError:
+            return
+        for component, props in body.get('response', {}).items():
+            for prop, value in props.items():
+                size = len(json.dumps(value, separators=(',', ':')))
+                self.observe('output_payload_bytes', '{}.{}'.format(component, prop), size)
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, (help_text, buckets, label, series) in self.histograms.items():
+                full_name = '{}_{}'.format(self.prefix, name)
+                lines.append('# HELP {} {}'.format(full_name, help_text))
+                lines.append('# TYPE {} histogram'.format(full_name))
+                for label_value, histogram in sorted(series.items()):
+                    lines.extend(histogram.lines(full_name, '{}="{}"'.format(label, label_value)))
+        for name, (help_text, read) in self.gauges.items():
+            full_name = '{}_{}'.format(self.prefix, name)
+            lines.append('# HELP {} {}'.format(full_name, help_text))
+            lines.append('# TYPE {} gauge'.format(full_name))
+            values = read()
+            if isinstance(values, dict):
+                lines.extend('{}{{key="{}"}} {}'.format(full_name, key, value) for key, value in sorted(values.items()))
+            else:
+                lines.append('{} {}'.format(full_name, values))
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,165 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import concurrent.futures
+import functools
+import multiprocessing
+import threading
+import time
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Compute Pool ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Optional process pool for the computations behind the callbacks.
+# The pool is forked on first use, after the dataset and the cube are loaded, so the processes share them
+# read-only (copy-on-write pages, the snapshot columns are memory-mapped anyway) and only the filters and
+# the results cross the pipe. A web worker waiting on the pool gives up after `timeout` seconds, and when
+# `max_pending` computations are already queued or running new ones are refused right away (HTTP 503)
+# instead of piling up behind a heavy filter. A filter change offloads one computation per callback, so by default
+# there is room for every offloaded function once per process.
+
+# name -> function, filled in the parent before the fork so the processes find the same functions
+FUNCTIONS = {}
+
+
+class PoolBusy(Exception):
+    pass
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PoolCancelled(Exception):
+    pass
+
+
+# While waiting for a computation still queued, how often should_cancel() is asked
+CANCEL_POLL_SECONDS = 0.05
+
+
+def call(name, *args):
+    # Runs in a pool process
+    return FUNCTIONS[name](*args)
+
+
+class ComputePool:
+
+    def __init__(self, processes=0, timeout=10.0, max_pending=None):
+        # processes=0: no pool, the functions run in the web worker like before
+        self.processes = processes
+        self.timeout = timeout
+        self.max_pending = max_pending
+        self.executor = None
+        self.lock = threading.Lock()
+        # Sized on the first call, once every function is offloaded (see get_slots)
+        self.slots = None
+        self.offloaded = []
+        self.counters = dict(submitted=0, rejected=0, timeouts=0, restarts=0, cancelled=0)
+        self.pending = 0
+        # Asked while a computation waits in the queue, True cancels it (e.g. its answer is not wanted any more)
+        self.should_cancel = lambda: False
+
+    @property
+    def enabled(self):
+        return self.processes > 0
+
+    def get_executor(self):
+        with self.lock:
+            if self.executor is None:
+                self.executor = concurrent.futures.ProcessPoolExecutor(
+                    max_workers=self.processes, mp_context=multiprocessing.get_context('fork'))
+            return self.executor
+
+    def get_slots(self):
+        with self.lock:
+            if self.slots is None:
+                self.max_pending = self.max_pending or len(self.offloaded) * self.processes
+                self.slots = threading.BoundedSemaphore(max(1, self.max_pending))
+            return self.slots
+
+    def restart(self):
+        # The processes hold a copy of the data of the fork, after the data changes the next call forks new ones
+        with self.lock:
+            executor, self.executor = self.executor, None
+            if executor is not None:
+                self.counters['restarts'] += 1
+        if executor is not None:
+            executor.shutdown(wait=False)
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Calls
+    # ___________________________________________________________________________________________________________________#
+
+    def release(self, future):
+        with self.lock:
+            self.pending -= 1
+        self.slots.release()
+
+    def run(self, name, *args):
+        if not self.enabled:
+            return FUNCTIONS[name](*args)
+
+        # Backpressure: the slot is held until the computation ends, even if the caller gave up on it
+        if not self.get_slots().acquire(blocking=False):
+            with self.lock:
+                self.counters['rejected'] += 1
+            raise PoolBusy(name)
+        with self.lock:
+            self.pending += 1
+            self.counters['submitted'] += 1
+        try:
+            future = self.get_executor().submit(call, name, *args)
+        except Exception:
+            self.release(None)
+            raise
+        future.add_done_callback(self.release)
+
+        try:
+            return self.wait(future, name)
+        except concurrent.futures.process.BrokenProcessPool:
+            # A process died (e.g. killed for its memory), the next call starts a new pool
+            self.restart()
+            raise
+
+    def wait(self, future, name):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                return future.result(timeout=max(0.0, min(CANCEL_POLL_SECONDS, deadline - time.monotonic())))
+            except concurrent.futures.TimeoutError:
+                if time.monotonic() >= deadline:
+                    future.cancel()
+                    with self.lock:
+                        self.counters['timeouts'] += 1
+                    raise PoolTimeout(name)
+                # Only a computation that has not started can be cancelled
+                if self.should_cancel() and future.cancel():
+                    with self.lock:
+                        self.counters['cancelled'] += 1
+                    raise PoolCancelled(name)
+
+    def stats(self):
+        with self.lock:
+            # max_pending is only known once the slots are sized, 0 until then (and without a pool)
+            return dict(self.counters, pending=self.pending, processes=self.processes,
+                        max_pending=self.max_pending or 0)
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Decorator
+    # ___________________________________________________________________________________________________________________#
+
+    def offload(self, function):
+        # The function runs in the pool, it must only take and return picklable values
+        name = '{}.{}'.format(function.__module__, function.__qualname__)
+        FUNCTIONS[name] = function
+        self.offloaded.append(name)
+
+        @functools.wraps(function)
+        def wrapper(*args):
+            return self.run(name, *args)
+
+        wrapper.pool = self
+        return wrapper
@@ -0,0 +1,106 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import functools
+import threading
+import uuid
+from collections import OrderedDict
+
+from dash.exceptions import PreventUpdate
+from flask import g, has_request_context
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Browser Sessions -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# A browser that changes the filters again before the answer of a callback came back only shows the last answer,
+# the previous ones are thrown away by Dash. Every page gets its own id (a dcc.Store of the layout, sent as a State
+# of the callbacks) so the server can tell: when a newer call of the same callback arrived from the same page, a
+# call that has not started computing is dropped (PreventUpdate, the browser keeps what it shows) instead of
+# computing a result nobody will see. Not a cookie: the tabs of a browser share it, and would drop each other's
+# calls.
+
+
+class Sessions:
+
+    def __init__(self, max_entries=10000):
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        # (page, callback) -> number of its latest call
+        self.latest = OrderedDict()
+        self.counters = dict(superseded=0)
+
+    def new_page(self):
+        # Id of a page being served, the data of its dcc.Store
+        return uuid.uuid4().hex
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Calls
+    # ___________________________________________________________________________________________________________________#
+
+    def begin(self, name):
+        # Numbers the call of a callback of the page of the request, it supersedes the previous ones
+        page = g.get('session_page')
+        if page is None:
+            return None
+        with self.lock:
+            key = (page, name)
+            number = self.latest.pop(key, 0) + 1
+            self.latest[key] = number
+            while len(self.latest) > self.max_entries:
+                self.latest.popitem(last=False)
+        return key, number
+
+    def superseded(self):
+        # True when the request being answered is not the latest call of its callback in its page any more
+        if not has_request_context():
+            return False
+        call = g.get('session_call')
+        if call is None:
+            return False
+        key, number = call
+        with self.lock:
+            return self.latest.get(key, number) != number
+
+    def drop(self):
+        with self.lock:
+            self.counters['superseded'] += 1
+        raise PreventUpdate
+
+    def stats(self):
+        with self.lock:
+            return dict(self.counters, tracked=len(self.latest))
+
+    # ___________________________________________________________________________________________________________________#
+    #                                               Decorators
+    # ___________________________________________________________________________________________________________________#
+
+    def page(self, function):
+        # The function registered in Dash, which gets the page id as its last State, calls the callback without it
+        @functools.wraps(function)
+        def wrapper(*args):
+            *args, g.session_page = args
+            return function(*args)
+
+        return wrapper
+
+    def track(self, function):
+        # Outermost, on every call of the callback, even the ones answered from the caches
+        @functools.wraps(function)
+        def wrapper(*args):
+            if has_request_context():
+                g.session_call = self.begin(function.__name__)
+            return function(*args)
+
+        return wrapper
+
+    def skip_superseded(self, function):
+        # Right before the computation: a superseded call does not start it
+        @functools.wraps(function)
+        def wrapper(*args):
+            if self.superseded():
+                self.drop()
+            return function(*args)
+
+        return wrapper
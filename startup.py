@@ -0,0 +1,145 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import argparse
+import importlib
+import importlib.util
+import json
+import os
+import re
+import subprocess
+import sys
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Lazy Startup ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# OLYMPICS_LAZY=1: importing app only sets up Dash and the routes. pandas and the modules built on it (dataset,
+# cube, figures and the indexes) are imported, and the data loaded, by app.warm_up on the first request or from
+# the gunicorn hooks, so a worker answers its health check right after it boots.
+
+LAZY = os.environ.get('OLYMPICS_LAZY') == '1'
+
+HEALTH_ROUTE = '/healthz'
+
+
+def lazy_import(name):
+    # The module, whose code only runs on the first access to one of its attributes in the lazy mode
+    if not LAZY or name in sys.modules:
+        return importlib.import_module(name)
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+class HealthCheck:
+    # WSGI middleware answering HEALTH_ROUTE before Flask: neither the data nor the first request setup of Dash
+    # (which builds the layout) is needed to tell that the worker is up. loaded() says if the data is there yet.
+
+    def __init__(self, wsgi_app, loaded):
+        self.wsgi_app = wsgi_app
+        self.loaded = loaded
+
+    def __call__(self, environ, start_response):
+        if environ.get('PATH_INFO') != HEALTH_ROUTE:
+            return self.wsgi_app(environ, start_response)
+        body = json.dumps(dict(status='ok', loaded=self.loaded())).encode()
+        start_response('200 OK', [('Content-Type', 'application/json'), ('Content-Length', str(len(body)))])
+        return [body]
+
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Startup Report -------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Boot time of the app, to follow from one release to the next: a fresh interpreter imports app with
+# `python -X importtime`, then warms it up. The report gives the import and warm-up times, the packages that take
+# the most of the import and the warm-up steps (app.startup_seconds).
+#
+#   python startup.py --repeat 3 --json startup.json
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|\s+(\S+)$')
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.warm_up()
+warm = time.perf_counter()
+print(json.dumps(dict(import_seconds=imported - start, warm_up_seconds=warm - imported, steps=app.startup_seconds)))
+'''
+
+
+def parse_importtime(stderr):
+    # {module: (self seconds, cumulative seconds)}
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, name = match.groups()
+            modules[name] = (int(own) / 1e6, int(cumulative) / 1e6)
+    return modules
+
+
+def probe(lazy):
+    env = dict(os.environ, OLYMPICS_LAZY='1' if lazy else '0')
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', PROBE], env=env, capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    times = json.loads(result.stdout.strip().splitlines()[-1])
+    modules = parse_importtime(result.stderr)
+    # Import time of each top level package, its submodules included
+    packages = {}
+    for name, (own, _) in modules.items():
+        package = name.split('.')[0]
+        packages[package] = packages.get(package, 0.0) + own
+    times['packages'] = packages
+    return times
+
+
+def report(lazy, repeat, top):
+    # Fastest of `repeat` runs, the others mostly measure a cold disk cache
+    runs = [probe(lazy) for _ in range(repeat)]
+    best = min(runs, key=lambda run: run['import_seconds'] + run['warm_up_seconds'])
+    packages = sorted(best['packages'].items(), key=lambda item: -item[1])[:top]
+    return dict(mode='lazy' if lazy else 'eager',
+                import_ms=round(best['import_seconds'] * 1000, 1),
+                warm_up_ms=round(best['warm_up_seconds'] * 1000, 1),
+                steps_ms={step: round(seconds * 1000, 1) for step, seconds in best['steps'].items()},
+                packages_ms={package: round(seconds * 1000, 1) for package, seconds in packages})
+
+
+def print_report(result):
+    print('')
+    print('{mode}: import {import_ms} ms + warm-up {warm_up_ms} ms'.format(**result))
+    for step, ms in result['steps_ms'].items():
+        print('  warm-up {:<24}{:>10}'.format(step, ms))
+    for package, ms in result['packages_ms'].items():
+        print('  import {:<25}{:>10}'.format(package, ms))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import and warm-up time of the app, eager and lazy')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per mode, the fastest one is reported')
+    parser.add_argument('--top', type=int, default=12, help='packages listed')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    results = []
+    for lazy in [False, True]:
+        result = report(lazy, args.repeat, args.top)
+        print_report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(results, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import re
+
+from flask import Flask
+
+from metrics import Metrics
+from pool import ComputePool
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- /metrics -------------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# name{labels} value, the value a number (or +Inf / -Inf / NaN)
+SAMPLE = re.compile(r'^[a-zA-Z_:][a-zA-Z0-9_:]*(\{[^}]*\})? (\S+)$')
+
+
+def scrape(metrics):
+    server = Flask(__name__)
+    metrics.install(server)
+    response = server.test_client().get('/metrics')
+    assert response.status_code == 200
+    return response.get_data(as_text=True)
+
+
+def samples(text):
+    # (series, value) of every sample, every line must be a comment or a valid sample
+    found = []
+    for line in text.splitlines():
+        if not line or line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        found.append((line.rsplit(' ', 1)[0], float(match.group(2))))
+    return found
+
+
+def test_metrics_with_the_pool_off():
+    # OLYMPICS_POOL_PROCESSES=0, the default: the slots are never sized
+    metrics = Metrics(enabled=True)
+    pool = ComputePool(processes=0)
+    pool.offload(len)
+    metrics.gauge('compute_pool', 'Counters of the callback process pool', lambda: pool.stats())
+
+    values = dict(samples(scrape(metrics)))
+    assert values['olympics_compute_pool{key="max_pending"}'] == 0
+    assert values['olympics_compute_pool{key="processes"}'] == 0
@@ -0,0 +1,60 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+from flask import Flask, g
+
+from sessions import Sessions
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Supersession ---------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+server = Flask(__name__)
+
+# Two tabs of the same browser: same cookies, a page id each
+COOKIE = {'Cookie': 'olympics_session=same-browser'}
+
+
+def call(callback, page, *args):
+    # One Dash request of the callback, from the page -> the (page, callback) number of the call
+    with server.test_request_context('/_dash-update-component', method='POST', headers=COOKIE):
+        return callback(*args, page)
+
+
+def superseded(sessions, session_call):
+    # Asked later, from the request of that call (e.g. by the pool while it waits)
+    with server.test_request_context('/_dash-update-component', method='POST', headers=COOKIE):
+        g.session_call = session_call
+        return sessions.superseded()
+
+
+def test_pages_sharing_a_cookie():
+    sessions = Sessions()
+
+    @sessions.page
+    @sessions.track
+    def update_country_indicators(year, country):
+        return g.session_call
+
+    first_tab = call(update_country_indicators, 'page-a', [1896, 2014], [])
+    second_tab = call(update_country_indicators, 'page-b', [1896, 2014], ['France'])
+    assert first_tab[0] != second_tab[0]
+    assert not superseded(sessions, first_tab)
+    assert not superseded(sessions, second_tab)
+
+    # A newer call from the first tab only supersedes the calls of that tab
+    call(update_country_indicators, 'page-a', [1900, 2014], [])
+    assert superseded(sessions, first_tab)
+    assert not superseded(sessions, second_tab)
+
+
+def test_the_callback_gets_the_filters_only():
+    sessions = Sessions()
+
+    @sessions.page
+    def update_gender_year(year, country, *filters):
+        return year, country, filters
+
+    assert call(update_gender_year, 'page-a', [1896, 2014], ['France'], ['Winter'], None) == \
+        ([1896, 2014], ['France'], (['Winter'], None))
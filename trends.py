@@ -0,0 +1,92 @@
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Import Packages ------------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+import numpy as np
+import pandas as pd
+
+import dataset
+
+# -------------------------------------------------------------------------------------------------------------------#
+# -------------------------------------------- Gender Gap Trend -----------------------------------------------------#
+# -------------------------------------------------------------------------------------------------------------------#
+
+# Prefix sums of the medals over the ordered Games, per country, gender and sport: prefix[i] holds the medals of
+# the Games before Games i, so the medals of any [start, end] window of the year slider are
+# prefix[end + 1] - prefix[start], whatever its length. The rows start to end + 1 give the women's share of the
+# medals, the cumulative medals per gender since the first Games of the window, and with prefix[start] holding
+# the whole history before it, the Games where women first won a medal in each sport.
+
+
+def prefix_sums(counts):
+    # Games x ... counts -> (Games + 1) x ... prefix sums, starting from zero
+    prefix = np.zeros((counts.shape[0] + 1,) + counts.shape[1:], dtype=np.int64)
+    np.cumsum(counts, axis=0, out=prefix[1:])
+    return prefix
+
+
+def trend_table(prefix, years, genders, sports):
+    # prefix: the prefix sums of the selection from the first Games of the window to just after the last one,
+    # (Games of the window + 1) x Gender x Sport, and years: the Games of the window. DataFrame of the Games with
+    # medals: medals per gender, cumulative medals per gender since the start of the window, women's share of both
+    # (%), and the sports where women won their first medal at those Games
+    years = np.asarray(years, dtype=np.int64)
+    totals = prefix.sum(axis=2)
+    per_games = np.diff(totals, axis=0)
+    cumulative = totals[1:] - totals[0]
+
+    def share(medals):
+        women = medals[:, genders.index('Women')] if 'Women' in genders else np.zeros(len(medals))
+        all_medals = medals.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(all_medals > 0, 100.0 * women / all_medals, np.nan)
+
+    table = pd.DataFrame(per_games, index=pd.Index(years, name='Year'), columns=genders)
+    for g, gender in enumerate(genders):
+        table[gender + '_Cumulative'] = cumulative[:, g]
+    table['Women_Share'] = share(per_games)
+    table['Women_Share_Cumulative'] = share(cumulative)
+
+    # First Games of each sport with a women's medal: no medal before the window (its first prefix row is zero),
+    # and the first Games of the window where its prefix becomes positive
+    first_women = [[] for _ in years]
+    if 'Women' in genders and len(years):
+        women = prefix[:, genders.index('Women'), :]
+        first = np.argmax(women[1:] > 0, axis=0)
+        for s in np.flatnonzero((women[0] == 0) & (women[-1] > 0)):
+            first_women[first[s]].append(sports[s])
+    table['First_Women_Sports'] = first_women
+    return table[per_games.sum(axis=1) > 0]
+
+
+class GenderGap:
+    # Prefix sums of the cube, rebuilt with it (a few MB, a few ms)
+
+    def __init__(self, cube):
+        self.years = np.asarray(cube.years, dtype=np.int64)
+        self.genders, self.sports = list(cube.genders), list(cube.sports)
+        self.country_index = cube.country_index
+        self.sport_index = {sport: s for s, sport in enumerate(self.sports)}
+        self.prefix = prefix_sums(np.asarray(cube.counts))
+        # Every country, the empty dropdown
+        self.prefix_all = self.prefix.sum(axis=1)
+
+    def countries(self, country):
+        return sorted({self.country_index[c] for c in country if c in self.country_index})
+
+    def sport_mask(self, sport):
+        # 1 for the sports of the filter (every sport when it's empty), 0 for the others
+        if not sport:
+            return np.ones(len(self.sports), dtype=np.int64)
+        mask = np.zeros(len(self.sports), dtype=np.int64)
+        mask[[self.sport_index[s] for s in sport if s in self.sport_index]] = 1
+        return mask
+
+    def trend(self, year, country=None, sport=None):
+        # Only the prefix rows of the window are read, and only the columns of the selected countries
+        start, end = dataset.year_range(self.years, year)
+        if country:
+            prefix = self.prefix[start:end + 1, self.countries(country)].sum(axis=1)
+        else:
+            prefix = self.prefix_all[start:end + 1]
+        return trend_table(prefix * self.sport_mask(sport), self.years[start:end], self.genders, self.sports)